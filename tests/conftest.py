@@ -1,6 +1,8 @@
 import sys
 import os
 
+import pytest
+
 
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(root_dir)
@@ -32,3 +34,19 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Версии ключей кеша сдвигаются только после коммита, а большинство
+    # тестов не коммитит: без очистки страница из прошлого теста
+    # отдалась бы из кеша.
+    from django.core.cache import cache
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def inline_image_workers(settings):
+    # Картинки обрабатываются в фоновых потоках, которые иначе пишут
+    # во временный MEDIA_ROOT уже после того, как тест его удалил.
+    settings.THUMBNAIL_WORKERS = 0
@@ -0,0 +1,122 @@
+"""
+Сериализация моделей в словари для JSON-ответов.
+
+Каждый сериализатор знает свои поля и какие связи им нужны: запрос
+подтягивает через select_related только связи выбранных в ``?fields=``
+полей, поэтому выдача списка - один SQL-запрос без N+1.
+"""
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from posts.models import AuthorStats
+
+
+class FieldError(ValueError):
+    """В ``?fields=`` запрошено неизвестное поле."""
+
+
+def _date(value):
+    return value.isoformat()
+
+
+def _author(user):
+    return {'username': user.username, 'full_name': user.get_full_name()}
+
+
+def _group(group):
+    if group is None:
+        return None
+    return {'slug': group.slug, 'title': group.title}
+
+
+def _stats(user):
+    return AuthorStats.objects.for_user(user)
+
+
+def _image(post):
+    return post.image.url if post.image else None
+
+
+def _image_variants(post):
+    return [{'format': variant['format'], 'width': variant['width'],
+             'url': default_storage.url(variant['name'])}
+            for variant in post.variants]
+
+
+class Serializer:
+    # имя поля -> функция от объекта
+    fields = {}
+    # имя поля -> связь для select_related
+    related = {}
+
+    def __init__(self, fields=None):
+        if not fields:
+            self.selected = list(self.fields)
+            return
+        unknown = [name for name in fields if name not in self.fields]
+        if unknown:
+            raise FieldError('Неизвестные поля: ' + ', '.join(unknown))
+        self.selected = list(dict.fromkeys(fields))
+
+    @classmethod
+    def from_request(cls, request):
+        fields = request.GET.get('fields', '')
+        return cls([name.strip() for name in fields.split(',')
+                    if name.strip()])
+
+    def prepare(self, queryset, prefix=''):
+        """Подключает к запросу связи выбранных полей."""
+        related = {prefix + self.related[name]
+                   for name in self.selected if name in self.related}
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        return queryset
+
+    def serialize(self, obj):
+        return {name: self.fields[name](obj) for name in self.selected}
+
+
+class PostSerializer(Serializer):
+    fields = {
+        'id': lambda post: post.id,
+        'text': lambda post: post.text,
+        'pub_date': lambda post: _date(post.pub_date),
+        'author': lambda post: _author(post.author),
+        'group': lambda post: _group(post.group),
+        'image': _image,
+        'image_variants': _image_variants,
+        'comment_count': lambda post: post.comment_count,
+        'url': lambda post: reverse('post', kwargs={
+            'username': post.author.username, 'post_id': post.id}),
+    }
+    related = {'author': 'author', 'group': 'group', 'url': 'author'}
+
+
+class CommentSerializer(Serializer):
+    fields = {
+        'id': lambda comment: comment.id,
+        'text': lambda comment: comment.text,
+        'created': lambda comment: _date(comment.created),
+        'author': lambda comment: _author(comment.author),
+    }
+    related = {'author': 'author'}
+
+
+class GroupSerializer(Serializer):
+    fields = {
+        'slug': lambda group: group.slug,
+        'title': lambda group: group.title,
+        'description': lambda group: group.description,
+    }
+
+
+class AuthorSerializer(Serializer):
+    fields = {
+        'username': lambda user: user.username,
+        'full_name': lambda user: user.get_full_name(),
+        'post_count': lambda user: _stats(user).post_count,
+        'follower_count': lambda user: _stats(user).follower_count,
+        'following_count': lambda user: _stats(user).following_count,
+    }
+    related = {'post_count': 'stats', 'follower_count': 'stats',
+               'following_count': 'stats'}
@@ -0,0 +1,93 @@
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTest(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create_user(username='Author',
+                                               first_name='Лев')
+        self.reader = User.objects.create_user(username='Reader')
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='Описание')
+        self.posts = [
+            Post.objects.create(text=f'Пост {number}', author=self.author,
+                                group=self.group)
+            for number in range(5)]
+        self.posts.reverse()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get(self, url, client=None, **params):
+        response = (client or self.client).get(url, params)
+        return response.status_code, response.json()
+
+    def test_cursor_pagination(self):
+        """Курсор next ведет на следующую страницу без повторов"""
+        status, first = self.get(reverse('api:posts'), limit=3)
+        self.assertEqual(status, 200)
+        self.assertEqual([post['id'] for post in first['results']],
+                         [post.id for post in self.posts[:3]])
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([post['id'] for post in second['results']],
+                         [post.id for post in self.posts[3:]])
+        self.assertIsNone(second['next'])
+        self.assertIsNotNone(second['previous'])
+
+    def test_post_fields(self):
+        """Пост сериализуется со связями, лишние поля можно отключить"""
+        post = self.posts[0]
+        status, data = self.get(reverse('api:post', args=[post.id]))
+        self.assertEqual(status, 200)
+        self.assertEqual(data['author'], {'username': 'Author',
+                                          'full_name': 'Лев'})
+        self.assertEqual(data['group'], {'slug': 'group',
+                                         'title': 'Группа'})
+        status, data = self.get(reverse('api:post', args=[post.id]),
+                                fields='id,text')
+        self.assertEqual(data, {'id': post.id, 'text': post.text})
+        status, data = self.get(reverse('api:post', args=[post.id]),
+                                fields='id,secret')
+        self.assertEqual(status, 400)
+
+    def test_feeds_filter_posts(self):
+        """Ленты группы, автора и подписок отдают свои посты"""
+        other = Post.objects.create(text='Чужой пост', author=self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+        for url, client in (
+                (reverse('api:group_posts', args=['group']), None),
+                (reverse('api:author_posts', args=['Author']), None),
+                (reverse('api:follow'), self.reader_client)):
+            with self.subTest(url=url):
+                status, data = self.get(url, client, fields='id')
+                self.assertEqual(status, 200)
+                ids = [post['id'] for post in data['results']]
+                self.assertEqual(ids, [post.id for post in self.posts])
+                self.assertNotIn(other.id, ids)
+
+    def test_details_and_errors(self):
+        """Группа, автор и комментарии; ошибки отдаются в JSON"""
+        Comment.objects.create(post=self.posts[0], author=self.reader,
+                               text='Комментарий')
+        status, data = self.get(reverse('api:author', args=['Author']))
+        self.assertEqual((data['post_count'], data['follower_count']),
+                         (5, 0))
+        status, data = self.get(reverse('api:group', args=['group']))
+        self.assertEqual(data['description'], 'Описание')
+        status, data = self.get(reverse('api:post_comments',
+                                        args=[self.posts[0].id]))
+        self.assertEqual(data['results'][0]['author']['username'],
+                         'Reader')
+        self.assertEqual(self.get(reverse('api:post', args=[0]))[0], 404)
+        self.assertEqual(self.get(reverse('api:follow'))[0], 401)
+
+    def test_queries_do_not_depend_on_page_size(self):
+        """Число запросов не зависит от размера страницы"""
+        def count(limit):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('api:posts'), {'limit': limit})
+            return len(queries)
+        self.assertEqual(count(1), count(5))
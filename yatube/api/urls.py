@@ -0,0 +1,17 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.posts, name='posts'),
+    path('posts/<int:post_id>/', views.post_detail, name='post'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
+    path('follow/', views.follow_posts, name='follow'),
+    path('groups/<slug:slug>/', views.group_detail, name='group'),
+    path('groups/<slug:slug>/posts/', views.group_posts, name='group_posts'),
+    path('authors/<str:username>/', views.author_detail, name='author'),
+    path('authors/<str:username>/posts/', views.author_posts,
+         name='author_posts'),
+]
@@ -0,0 +1,138 @@
+from functools import wraps
+from operator import attrgetter
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from posts.caching import cache_anonymous_page
+from posts.models import Comment, FeedEntry, Group, Post, User
+from posts.paginator import KeysetPaginator
+from .serializers import (AuthorSerializer, CommentSerializer, FieldError,
+                          GroupSerializer, PostSerializer)
+
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+
+def _error(status, message):
+    return JsonResponse({'error': message}, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def api_view(view):
+    """GET-обработчик API: ошибки полей и 404 отдаются в JSON."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except FieldError as exc:
+            return _error(400, str(exc))
+        except (Post.DoesNotExist, Group.DoesNotExist, User.DoesNotExist):
+            return _error(404, 'Не найдено')
+    return wrapper
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise FieldError('limit должен быть числом')
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def _link(request, name, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    for param in ('after', 'before', 'page'):
+        params.pop(param, None)
+    params[name] = cursor
+    return request.build_absolute_uri('?' + params.urlencode())
+
+
+def _paginated(request, queryset, serializer, keys=('pub_date', 'id'),
+               transform=None):
+    paginator = KeysetPaginator(queryset, _page_size(request), keys=keys,
+                                transform=transform)
+    page = paginator.get_cursor_page(request.GET)
+    return JsonResponse({
+        'results': [serializer.serialize(obj) for obj in page],
+        'next': _link(request, 'after', page.next_cursor),
+        'previous': _link(request, 'before', page.previous_cursor),
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def _post_feed(request, **filters):
+    serializer = PostSerializer.from_request(request)
+    return _paginated(request,
+                      serializer.prepare(Post.objects.filter(**filters)),
+                      serializer)
+
+
+def _detail(request, serializer_class, queryset, **lookup):
+    serializer = serializer_class.from_request(request)
+    obj = serializer.prepare(queryset).get(**lookup)
+    return JsonResponse(serializer.serialize(obj),
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@api_view
+@cache_anonymous_page('posts')
+def posts(request):
+    return _post_feed(request)
+
+
+@api_view
+@cache_anonymous_page('post:{post_id}')
+def post_detail(request, post_id):
+    return _detail(request, PostSerializer, Post.objects, id=post_id)
+
+
+@api_view
+@cache_anonymous_page('post:{post_id}')
+def post_comments(request, post_id):
+    post = Post.objects.only('id').get(id=post_id)
+    serializer = CommentSerializer.from_request(request)
+    return _paginated(
+        request, serializer.prepare(Comment.objects.filter(post=post)),
+        serializer, keys=('created', 'id'))
+
+
+@api_view
+@cache_anonymous_page('group:{slug}')
+def group_detail(request, slug):
+    return _detail(request, GroupSerializer, Group.objects, slug=slug)
+
+
+@api_view
+@cache_anonymous_page('group:{slug}')
+def group_posts(request, slug):
+    group = Group.objects.only('id').get(slug=slug)
+    return _post_feed(request, group=group)
+
+
+@api_view
+@cache_anonymous_page('author:{username}')
+def author_detail(request, username):
+    return _detail(request, AuthorSerializer, User.objects,
+                   username=username)
+
+
+@api_view
+@cache_anonymous_page('author:{username}')
+def author_posts(request, username):
+    author = User.objects.only('id').get(username=username)
+    return _post_feed(request, author=author)
+
+
+@api_view
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        return _error(401, 'Нужна авторизация')
+    serializer = PostSerializer.from_request(request)
+    entries = serializer.prepare(
+        FeedEntry.objects.filter(user=request.user).select_related('post'),
+        prefix='post__')
+    return _paginated(request, entries, serializer,
+                      transform=attrgetter('post'))
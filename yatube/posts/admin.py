@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Post, Group, Comment
+from .search import filter_matching
 
 
 class Posts(admin.ModelAdmin):
@@ -8,6 +9,11 @@ class Posts(admin.ModelAdmin):
     search_fields = ('text',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return filter_matching(queryset, search_term), False
+
 
 class Groups(admin.ModelAdmin):
     list_display = ('pk', 'title', 'description')
@@ -0,0 +1,30 @@
+"""Помощники массовой загрузки данных в обход сигналов моделей."""
+import itertools
+from contextlib import contextmanager
+
+from django.db.models import Max
+
+
+@contextmanager
+def manual_dates(*fields):
+    """Отключает auto_now_add, чтобы даты можно было задать самим."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def next_id(model):
+    return (model.objects.aggregate(top=Max('id'))['top'] or 0) + 1
@@ -0,0 +1,154 @@
+"""
+Версии кешируемых областей.
+
+Каждая область (главная лента 'posts', группа 'group:<slug>', автор
+'author:<username>', пост 'post:<id>') хранит в общем кеше свою
+версию - метку времени последнего изменения в микросекундах. Страницы
+зависят еще и от области всего сайта SITE: ее сдвигают массовые
+операции, после которых затронутые объекты не перечислить.
+Версии входят в ключи кеша, поэтому запись в область сразу делает
+старые ключи недостижимыми, а TTL можно держать большим. Это верно
+только для общего кеша (settings.SHARED_CACHE): в кеше процесса версию
+сдвигает лишь воркер, обработавший запись, поэтому там версии истекают
+через CACHE_VERSION_TIMEOUT.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from yatube import routers
+
+VERSION_KEY = 'version:{}'
+PAGE_KEY = 'page:{}:{}'
+SITE = 'site'
+
+
+def _now():
+    return int(time.time() * 1000000)
+
+
+def get_versions(*scopes):
+    """
+    Версии областей в том же порядке; недостающие заводит сейчас.
+
+    Если какая-то область изменилась не раньше REPLICA_PIN_SECONDS назад,
+    запрос дальше читает из основной базы: реплика может еще не видеть
+    изменения, а отрисованное по ней легло бы в кеш под новой версией.
+    """
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    stored = cache.get_many(keys)
+    missing = {key: _now() for key in keys if key not in stored}
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, settings.CACHE_VERSION_TIMEOUT)
+        stored.update(cache.get_many(list(missing)))
+    versions = [stored.get(key, missing.get(key)) for key in keys]
+    lag = settings.REPLICA_PIN_SECONDS * 1000000
+    if (settings.DATABASE_REPLICAS and versions
+            and _now() - max(versions) < lag):
+        routers.use_primary()
+    return versions
+
+
+def cache_version(*scopes):
+    """Строка для ключа кеша, меняется при изменении любой из областей."""
+    return '.'.join(str(version) for version in get_versions(*scopes))
+
+
+def bump(*scopes):
+    cache.set_many({VERSION_KEY.format(scope): _now() for scope in scopes},
+                   settings.CACHE_VERSION_TIMEOUT)
+
+
+def post_scopes(post):
+    """Области страниц, на которых виден пост."""
+    scopes = ['posts', f'post:{post.id}', f'author:{post.author.username}']
+    if post.group_id is not None:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+def cache_anonymous_page(*scopes):
+    """
+    Кеширует готовый ответ для анонимных GET-запросов.
+
+    Ключ собирается из полного пути запроса и версий областей ``scopes``;
+    в областях можно ссылаться на аргументы view: ``'author:{username}'``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            version = cache_version(
+                SITE, *(scope.format(**kwargs) for scope in scopes))
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = PAGE_KEY.format(version, path)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = view(request, *args, **kwargs)
+                # Ответы с cookie (CSRF, сообщения) принадлежат одному
+                # посетителю и в общий кеш не попадают.
+                if response.status_code == 200 and not response.cookies:
+                    cache.set(key, (response.content,
+                                    response['Content-Type']),
+                              settings.PAGE_CACHE_TIMEOUT)
+            patch_vary_headers(response, ('Cookie', ))
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_page(*scopes):
+    """
+    ETag и Last-Modified по версиям областей ``scopes``.
+
+    Если страница у клиента актуальна, отвечает 304 до вызова view:
+    ни ORM, ни шаблоны не нужны, версии берутся из кеша. Страница
+    вошедшего пользователя зависит от него самого, поэтому его id входит
+    в ETag, а Last-Modified (по нему нельзя отличить пользователей)
+    отдается только гостям.
+
+    Версии в кеше процесса не видят записей других воркеров, и 304
+    подтверждал бы устаревшую страницу, поэтому без общего кеша
+    валидаторы не отдаются.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or not settings.SHARED_CACHE):
+                return view(request, *args, **kwargs)
+            versions = get_versions(
+                SITE, *(scope.format(**kwargs) for scope in scopes))
+            private = request.user.is_authenticated
+            etag = quote_etag('{}-{}-{}'.format(
+                settings.RELEASE_ID, request.user.id or 0,
+                '.'.join(str(version) for version in versions)))
+            last_modified = None if private else max(versions) // 1000000
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Без no-cache браузер сочтет страницу свежей по Last-Modified
+            # и не станет ее перепроверять.
+            patch_cache_control(response, no_cache=True, private=private)
+            patch_vary_headers(response, ('Cookie', ))
+            return response
+        return wrapper
+    return decorator
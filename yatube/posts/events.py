@@ -0,0 +1,164 @@
+"""
+Поток событий о новых постах (Server-Sent Events).
+
+Брокер живет в памяти процесса: new_post после коммита публикует
+событие, и его сразу получают открытые в этом процессе потоки
+подписчиков автора или группы. Номер события - id поста, поэтому
+клиент, переподключившись с Last-Event-ID, догоняет пропущенное
+запросом к базе, в том числе посты, записанные другими процессами.
+Поток закрывается через EVENTS_STREAM_SECONDS, и EventSource сам
+переподключается: так задержка событий из соседних процессов не больше
+этого времени.
+
+Брокер общий только внутри процесса: при нескольких процессах пост,
+записанный соседним, клиент увидит лишь при переподключении, до
+EVENTS_STREAM_SECONDS позже. Мгновенная доставка рассчитана на один
+процесс; общего канала (Redis pub/sub и т. п.) здесь нет.
+
+Поток занимает поток-обработчик на все время жизни, поэтому рассчитан
+на развертывание через yatube.asgi с пулом потоков, а число открытых
+потоков в процессе ограничено EVENTS_MAX_STREAMS. Страницы открывают
+поток только по нажатию кнопки.
+"""
+import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.urls import reverse
+
+# Сколько пропущенных постов догонять; при большем отставании клиенту
+# предлагается перезагрузить страницу
+CATCH_UP = 50
+# Через сколько миллисекунд EventSource переподключается
+RETRY_MS = 3000
+
+
+class Subscriber:
+    def __init__(self, channels, size):
+        self.channels = frozenset(channels)
+        self.queue = queue.Queue(size)
+        # Очередь переполнялась: после нее поток закрывается, и клиент
+        # догоняет пропущенное из базы
+        self.overflowed = False
+
+
+class Busy(Exception):
+    """Открыто предельное число потоков."""
+
+
+class Broker:
+    """Раздает события подписчикам каналов вида author:<id>, group:<id>."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.subscribers = set()
+
+    def add(self, channels, limit=None):
+        subscriber = Subscriber(channels, self.queue_size)
+        with self.lock:
+            if limit is not None and len(self.subscribers) >= limit:
+                raise Busy
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def remove(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    @contextmanager
+    def subscribe(self, channels, limit=None):
+        subscriber = self.add(channels, limit)
+        try:
+            yield subscriber
+        finally:
+            self.remove(subscriber)
+
+    def publish(self, channels, event):
+        with self.lock:
+            subscribers = [subscriber for subscriber in self.subscribers
+                           if subscriber.channels & channels]
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(event)
+            except queue.Full:
+                subscriber.overflowed = True
+
+
+broker = Broker()
+
+
+def payload(post_id, username, group_slug):
+    return {'id': post_id, 'author': username, 'group': group_slug,
+            'card': reverse('post_card', args=[username, post_id])}
+
+
+def publish_post(post):
+    channels = {f'author:{post.author_id}'}
+    if post.group_id:
+        channels.add(f'group:{post.group_id}')
+    broker.publish(channels, payload(
+        post.id, post.author.username,
+        post.group.slug if post.group_id else None))
+
+
+def _format(event):
+    data = json.dumps(event, ensure_ascii=False)
+    return f'id: {event["id"]}\nevent: post\ndata: {data}\n\n'
+
+
+class Stream:
+    """
+    Поток SSE для StreamingHttpResponse: сначала посты из ``posts`` новее
+    ``last_id``, затем новые события каналов ``channels``.
+
+    Место у брокера занимается при создании, чтобы при переполнении сразу
+    ответить 503 (исключение Busy), и освобождается в close(): сервер
+    вызывает его, даже если так и не начал читать поток.
+    """
+
+    def __init__(self, channels, posts, last_id=None):
+        # Подписка раньше запроса к базе, чтобы между ними ничего не потерять
+        self.subscriber = broker.add(channels, settings.EVENTS_MAX_STREAMS)
+        self.events = self.read(posts, last_id)
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        broker.remove(self.subscriber)
+
+    def read(self, posts, last_id):
+        subscriber = self.subscriber
+        yield f'retry: {RETRY_MS}\n\n'
+        if last_id is not None:
+            missed = list(posts.filter(id__gt=last_id).order_by('id')
+                          .values_list('id', 'author__username',
+                                       'group__slug')[:CATCH_UP + 1])
+            if len(missed) > CATCH_UP:
+                yield 'event: reset\ndata: {}\n\n'
+                return
+            for row in missed:
+                yield _format(payload(*row))
+                last_id = row[0]
+        deadline = time.monotonic() + settings.EVENTS_STREAM_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (subscriber.overflowed
+                                  and subscriber.queue.empty()):
+                return
+            try:
+                event = subscriber.queue.get(
+                    timeout=min(remaining, settings.EVENTS_HEARTBEAT_SECONDS))
+            except queue.Empty:
+                # Комментарий SSE: прокси не закрывают молчащее соединение
+                yield ': ping\n\n'
+                continue
+            # Событие могло уже прийти при догоняющем чтении из базы
+            if last_id is None or event['id'] > last_id:
+                last_id = event['id']
+                yield _format(event)
@@ -0,0 +1,97 @@
+"""
+Потоковая выгрузка постов, комментариев и подписок в JSONL или CSV.
+
+Строки читаются из базы кусками через QuerySet.iterator(), кодируются
+по одной и отдаются пачками байт, при желании сразу сжатыми gzip. Ни
+выборка, ни файл целиком в памяти не держатся, поэтому расход памяти
+не зависит от размера таблицы.
+"""
+import csv
+import datetime as dt
+import io
+import json
+import zlib
+
+from .models import Comment, Follow, Post
+
+# Имя выгрузки -> (модель, [(колонка, поле для values_list)])
+EXPORTS = {
+    'posts': (Post, [
+        ('id', 'id'),
+        ('author', 'author__username'),
+        ('group', 'group__slug'),
+        ('text', 'text'),
+        ('pub_date', 'pub_date'),
+        ('comment_count', 'comment_count'),
+    ]),
+    'comments': (Comment, [
+        ('id', 'id'),
+        ('post', 'post_id'),
+        ('author', 'author__username'),
+        ('text', 'text'),
+        ('created', 'created'),
+    ]),
+    'follows': (Follow, [
+        ('id', 'id'),
+        ('user', 'user__username'),
+        ('author', 'author__username'),
+    ]),
+}
+FORMATS = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+# Примерный размер пачки, которая кодируется и отдается за раз
+BATCH_BYTES = 64 * 1024
+
+
+def _rows(name, chunk_size):
+    model, columns = EXPORTS[name]
+    rows = model.objects.order_by('id').values_list(
+        *(lookup for _, lookup in columns)).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield [value.isoformat() if isinstance(value, dt.datetime)
+               else value for value in row]
+
+
+def _lines(name, fmt, chunk_size):
+    names = [column for column, _ in EXPORTS[name][1]]
+    rows = _rows(name, chunk_size)
+    if fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(names, row)), ensure_ascii=False) + '\n'
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= BATCH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream(name, fmt='jsonl', compress=False, chunk_size=2000):
+    """Выгрузка ``name`` в виде итератора кусков байт."""
+    # wbits=31 - формат gzip, а не голый zlib
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    parts, size = [], 0
+    for line in _lines(name, fmt, chunk_size):
+        parts.append(line)
+        size += len(line)
+        if size < BATCH_BYTES:
+            continue
+        data = ''.join(parts).encode()
+        parts, size = [], 0
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    data = ''.join(parts).encode()
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def filename(name, fmt, compress):
+    return f'{name}.{fmt}' + ('.gz' if compress else '')
@@ -0,0 +1,125 @@
+"""
+Адаптивные варианты картинки поста.
+
+Картинка один раз при записи обрезается под пропорции карточки
+и сохраняется в нескольких ширинах и современных форматах; описание
+вариантов хранится в Post.image_variants и выводится через
+<picture>/srcset, так что sorl на чтении не нужен.
+"""
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import caching
+from .models import Post
+from .thumbnails import submit
+
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+EXTENSIONS = {
+    'AVIF': 'avif',
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+}
+
+
+def supported_formats():
+    """Форматы из POST_IMAGE_FORMATS, которые умеет сохранять Pillow."""
+    Image.init()
+    return [fmt for fmt in settings.POST_IMAGE_FORMATS if fmt in Image.SAVE]
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    image.save(buffer, fmt, quality=settings.POST_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def delete_variants(variants):
+    for variant in variants:
+        default_storage.delete(variant['name'])
+
+
+def generate_variants(post_id, stale=()):
+    """
+    Готовит варианты текущей картинки поста. ``stale`` - варианты
+    прежней картинки: они удаляются, когда уже не нужны.
+    """
+    post = Post.objects.filter(id=post_id).select_related(
+        'author', 'group').first()
+    if post is None or not post.image:
+        delete_variants(stale)
+        return
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    with post.image.open('rb') as source:
+        image = Image.open(source)
+        image.load()
+    image = image.convert('RGB')
+    # Имя картинки в хранилище уникально, поэтому варианты новой
+    # картинки не пересекаются с еще не удаленными вариантами старой.
+    stem = os.path.splitext(os.path.basename(post.image.name))[0]
+    variants = []
+    for width in settings.POST_IMAGE_WIDTHS:
+        height = round(width * ratio_height / ratio_width)
+        resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        for fmt in supported_formats():
+            name = default_storage.save(
+                f'posts/variants/{post.id}/{stem}-{width}.{EXTENSIONS[fmt]}',
+                ContentFile(_encode(resized, fmt)))
+            variants.append({'format': fmt, 'width': width,
+                             'height': height, 'name': name})
+    # Пока шла обработка, картинку могли заменить - тогда варианты
+    # уже не нужны, их сделает следующая задача.
+    updated = Post.objects.filter(id=post.id, image=post.image.name).update(
+        image_variants=json.dumps(variants), updated=timezone.now())
+    delete_variants(stale)
+    delete_variants(post.variants if updated else variants)
+    if updated:
+        caching.bump(*caching.post_scopes(post))
+
+
+def queue_variants(post, stale=()):
+    """
+    Ставит подготовку вариантов картинки в очередь после коммита.
+    Варианты прежней картинки ``stale`` удаляются там же.
+    """
+    post_id = post.id
+    stale = list(stale)
+    if post.image:
+        transaction.on_commit(
+            lambda: submit(generate_variants, post_id, stale))
+    elif stale:
+        transaction.on_commit(lambda: submit(delete_variants, stale))
+
+
+def picture_sources(post):
+    """
+    Источники для <picture>: по одному srcset на формат, от самого
+    легкого формата к JPEG, и запасная картинка для <img>.
+    """
+    by_format = {}
+    for variant in post.variants:
+        by_format.setdefault(variant['format'], []).append(variant)
+    sources = []
+    for fmt in MIME_TYPES:
+        variants = sorted(by_format.get(fmt, ()), key=lambda v: v['width'])
+        if variants:
+            sources.append({
+                'type': MIME_TYPES[fmt],
+                'srcset': ', '.join(
+                    f"{default_storage.url(v['name'])} {v['width']}w"
+                    for v in variants),
+                'largest': variants[-1],
+                'url': default_storage.url(variants[-1]['name']),
+            })
+    return sources
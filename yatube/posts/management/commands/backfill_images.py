@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.images import generate_variants
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails, ready_thumbnail
+
+
+class Command(BaseCommand):
+    help = ('Нарезает миниатюры и адаптивные варианты картинкам, у которых '
+            'их нет: постам до появления фоновой нарезки, сохраненным в '
+            'обход views или с упавшей задачей.')
+
+    def handle(self, *args, **options):
+        thumbnails = variants = failed = 0
+        posts = Post.objects.exclude(image='').exclude(image=None).only(
+            'id', 'image', 'image_variants').order_by('id')
+        for post in posts.iterator():
+            try:
+                if not all(ready_thumbnail(post.image, name)
+                           for name in settings.POST_THUMBNAILS):
+                    generate_thumbnails(post.image.name)
+                    thumbnails += 1
+                if not post.image_variants:
+                    generate_variants(post.id)
+                    variants += 1
+            except OSError as error:
+                failed += 1
+                self.stderr.write(f'Пост {post.id}: {error}')
+        self.stdout.write(f'Нарезаны миниатюры: {thumbnails}, '
+                          f'варианты: {variants}, ошибок: {failed}')
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+
+from posts.management.commands.bench_views import percentile
+from posts.models import Group, Post
+from yatube.asgi import WsgiToAsgi, build_environ
+
+
+def with_io_delay(wsgi_application, seconds):
+    """Добавляет каждому запросу блокирующее ожидание, как у медленного
+    хранилища картинок или генерации миниатюры."""
+    def application(environ, start_response):
+        time.sleep(seconds)
+        return wsgi_application(environ, start_response)
+    return application
+
+
+def http_scope(path):
+    return {'type': 'http', 'method': 'GET', 'path': path,
+            'query_string': b'', 'headers': [(b'host', b'localhost')]}
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест: одни и те же страницы при растущем числе '
+            'одновременных запросов через WSGI с ограниченным числом '
+            'синхронных воркеров и через yatube.asgi с пулом потоков. '
+            'Оба варианта работают в этом процессе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--levels', default='1,8,32,64',
+                            help='Уровни одновременных запросов.')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на каждый уровень.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Синхронных воркеров WSGI.')
+        parser.add_argument('--threads', type=int,
+                            default=settings.ASGI_THREADS,
+                            help='Потоков пула ASGI.')
+        parser.add_argument('--io-ms', type=float, default=20,
+                            help='Блокирующее ожидание в каждом запросе; '
+                                 '0 - только работа Django и базы.')
+
+    def paths(self):
+        post = Post.objects.select_related('author').order_by('-id').first()
+        group = Group.objects.order_by('id').first()
+        if post is None or group is None:
+            raise CommandError('База пуста: сначала запустите '
+                               'generate_dataset.')
+        return [
+            reverse('index'),
+            reverse('group', args=[group.slug]),
+            reverse('profile', args=[post.author.username]),
+            reverse('post', args=[post.author.username, post.id]),
+        ]
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['levels'].split(',')]
+        except ValueError:
+            raise CommandError('--levels: числа через запятую.')
+        paths = self.paths()
+        wsgi = with_io_delay(get_wsgi_application(), options['io_ms'] / 1000)
+        deployments = {
+            f'wsgi x{options["workers"]}': self.wsgi_client(
+                wsgi, options['workers']),
+            f'asgi x{options["threads"]}': self.asgi_client(
+                WsgiToAsgi(wsgi, options['threads'])),
+        }
+        self.stdout.write(f'{"":<10} {"одновр.":>7} {"rps":>8} '
+                          f'{"p50 мс":>8} {"p95 мс":>8} {"ошибок":>6}')
+        for name, client in deployments.items():
+            for level in levels:
+                result = asyncio.run(self.load(
+                    client, paths, level, options['requests']))
+                self.stdout.write(
+                    '{:<10} {:>7} {rps:>8.0f} {p50:>8.1f} {p95:>8.1f} '
+                    '{errors:>6}'.format(name, level, **result))
+
+    def wsgi_client(self, application, workers):
+        """Каждый воркер обслуживает один запрос, остальные ждут в очереди."""
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+        def call(path):
+            statuses = []
+            chunks = application(build_environ(http_scope(path), b''),
+                                 lambda status, headers: statuses.append(
+                                     int(status[:3])))
+            try:
+                for _ in chunks:
+                    pass
+            finally:
+                chunks.close()
+            return statuses[0]
+
+        async def client(path):
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, call, path)
+        return client
+
+    def asgi_client(self, application):
+        async def client(path):
+            statuses = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+            await application(http_scope(path), receive, send)
+            return statuses[0]
+        return client
+
+    async def load(self, client, paths, level, total):
+        semaphore = asyncio.Semaphore(level)
+        timings, errors = [], 0
+
+        async def one(number):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                status = await client(paths[number % len(paths)])
+                timings.append(time.perf_counter() - started)
+                errors += status != 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(number) for number in range(total)))
+        elapsed = time.perf_counter() - started
+        return {'rps': total / elapsed,
+                'p50': percentile(timings, 0.5) * 1000,
+                'p95': percentile(timings, 0.95) * 1000,
+                'errors': errors}
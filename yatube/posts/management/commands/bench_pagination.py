@@ -0,0 +1,60 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+
+from posts.models import Post
+from posts.paginator import KeysetPaginator
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время выдачи глубокой страницы ленты '
+            'для Paginator (COUNT + OFFSET) и KeysetPaginator.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--per-page', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def _measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        number = options['page']
+        per_page = options['per_page']
+        repeat = options['repeat']
+        post_list = Post.objects.select_related('author', 'group')
+        offset = (number - 1) * per_page
+        if number < 2 or not post_list.order_by()[offset:offset + 1]:
+            raise CommandError(
+                f'В базе нет страницы {number}: '
+                f'нужно хотя бы {offset + 1} записей.')
+
+        def offset_page():
+            paginator = Paginator(post_list.order_by('-pub_date', '-id'),
+                                  per_page)
+            list(paginator.page(number))
+
+        keyset = KeysetPaginator(post_list, per_page)
+        # Курсор предыдущей страницы строится один раз вне замера -
+        # так же, как его получает пользователь из ссылки "Следующая".
+        boundary = keyset.object_list[offset - 1]
+        cursor = keyset.encode_cursor(
+            number - 1, (boundary.pub_date, boundary.id))
+
+        def keyset_page():
+            list(keyset.get_cursor_page({'after': cursor}))
+
+        total = Post.objects.count()
+        self.stdout.write(f'Записей: {total}, страница {number}, '
+                          f'медиана из {repeat} замеров')
+        self.stdout.write('  Paginator:       {:.2f} ms'.format(
+            self._measure(offset_page, repeat)))
+        self.stdout.write('  KeysetPaginator: {:.2f} ms'.format(
+            self._measure(keyset_page, repeat)))
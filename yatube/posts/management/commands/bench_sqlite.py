@@ -0,0 +1,110 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError
+from django.db.utils import ConnectionHandler
+
+# Профили подключения: (настройки базы, держать ли соединение)
+PROFILES = {
+    'default': ({'ENGINE': 'django.db.backends.sqlite3',
+                 'OPTIONS': {'timeout': 5}}, False),
+    'production': ({'ENGINE': 'yatube.backends.sqlite3'}, True),
+}
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'text TEXT, pub_date TEXT)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite при одновременных '
+            'чтении и записи: стандартный backend с подключением на каждый '
+            'запрос против WAL с PRAGMA и постоянными соединениями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--rows', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name, (database, persistent) in PROFILES.items():
+                path = os.path.join(directory, f'{name}.sqlite3')
+                # У каждого профиля свой набор подключений с одной базой
+                handler = ConnectionHandler({
+                    DEFAULT_DB_ALIAS: dict(database, NAME=path)})
+                self.seed(handler[DEFAULT_DB_ALIAS], options['rows'])
+                results[name] = self.run(handler, persistent, options)
+                handler[DEFAULT_DB_ALIAS].close()
+                self.stdout.write(
+                    '{:<11} чтений/с: {reads:>8.0f}  записей/с: '
+                    '{writes:>7.0f}  ошибок: {errors}'.format(
+                        name, **results[name]))
+        base, tuned = results['default'], results['production']
+        for kind in ('reads', 'writes'):
+            if base[kind]:
+                self.stdout.write(f'{kind}: x{tuned[kind] / base[kind]:.1f}')
+
+    def seed(self, connection, rows):
+        with connection.cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            cursor.executemany(
+                'INSERT INTO post (author_id, text, pub_date) '
+                'VALUES (%s, %s, %s)',
+                [(number % 100, 'Текст поста ' * 20, f'{number:010d}')
+                 for number in range(rows)])
+
+    def run(self, handler, persistent, options):
+        deadline = time.perf_counter() + options['seconds']
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(write):
+            connection = handler[DEFAULT_DB_ALIAS]
+            done = errors = 0
+            rng = random.Random()
+            while time.perf_counter() < deadline:
+                try:
+                    with connection.cursor() as cursor:
+                        if write:
+                            cursor.execute(
+                                'INSERT INTO post (author_id, text, pub_date)'
+                                ' VALUES (%s, %s, %s)',
+                                (1, 'Новый пост', f'{time.time():.6f}'))
+                        else:
+                            cursor.execute(
+                                'SELECT id, text FROM post ORDER BY pub_date '
+                                'DESC LIMIT 10 OFFSET %s',
+                                (rng.randrange(1000), ))
+                            cursor.fetchall()
+                    done += 1
+                except OperationalError:
+                    errors += 1
+                if not persistent:
+                    # Как CONN_MAX_AGE=0: новое подключение на каждый запрос
+                    connection.close()
+            connection.close()
+            with lock:
+                counts['writes' if write else 'reads'] += done
+                counts['errors'] += errors
+
+        threads = [threading.Thread(target=worker, args=(False, ))
+                   for _ in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=(True, ))
+                    for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {'reads': counts['reads'] / options['seconds'],
+                'writes': counts['writes'] / options['seconds'],
+                'errors': counts['errors']}
@@ -0,0 +1,65 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from sorl.thumbnail import delete, get_thumbnail
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = ('Замеряет холодный рендер страницы ленты с картинками: '
+            'нарезка миниатюр во время запроса против фоновой нарезки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--per-page', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def _render(self, posts):
+        return ''.join(
+            render_to_string('includes/post_item.html', {'post': post})
+            for post in posts)
+
+    def _cold(self, posts):
+        for post in posts:
+            delete(post.image, delete_file=False)
+
+    def _measure(self, posts, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            self._cold(posts)
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        posts = list(Post.objects.exclude(image='').exclude(
+            image=None).select_related('author', 'group')[
+                :options['per_page']])
+        if not posts:
+            raise CommandError('В базе нет постов с картинками.')
+
+        def inline():
+            # Так страница рендерилась раньше: sorl нарезал миниатюру
+            # прямо в шаблоне у первого посетителя.
+            for post in posts:
+                for geometry, extra in settings.POST_THUMBNAILS.values():
+                    get_thumbnail(post.image, geometry, **extra)
+            self._render(posts)
+
+        def background():
+            self._render(posts)
+
+        repeat = options['repeat']
+        self.stdout.write(f'Постов с картинками на странице: {len(posts)}, '
+                          f'медиана из {repeat} замеров')
+        self.stdout.write('  нарезка в запросе: {:.2f} ms'.format(
+            self._measure(posts, inline, repeat)))
+        self.stdout.write('  фоновая нарезка:   {:.2f} ms'.format(
+            self._measure(posts, background, repeat)))
+        for post in posts:
+            generate_thumbnails(post.image.name)
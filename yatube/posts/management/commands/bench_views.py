@@ -0,0 +1,226 @@
+import gc
+import json
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+# JSON API и HTML-страницы с теми же данными - для сравнения пропускной
+# способности
+COUNTERPARTS = {
+    'api_posts': 'index',
+    'api_group_posts': 'group_posts',
+    'api_author_posts': 'profile',
+    'api_post': 'post_view',
+    'api_follow': 'follow_index',
+}
+
+
+class Rollback(Exception):
+    """Откатывает транзакцию замера пишущего запроса."""
+
+
+def percentile(values, share):
+    """Процентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(math.ceil(share * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = ('Гоняет основные страницы через тестовый клиент на текущей '
+            'базе, меряет p50/p95, число запросов и объем ответа и '
+            'сравнивает их с эталоном.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--baseline', default=settings.BENCH_BASELINE,
+                            help='Файл с эталонными замерами.')
+        parser.add_argument('--threshold', type=float,
+                            default=settings.BENCH_THRESHOLD,
+                            help='Допустимый рост p95 и объема ответа.')
+        parser.add_argument('--slack', type=float, default=2.0,
+                            help='Сколько миллисекунд роста не считать '
+                                 'регрессией, сверх threshold.')
+        parser.add_argument('--save', action='store_true',
+                            help='Записать замеры как новый эталон.')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Не сбрасывать кеш перед запросами.')
+        parser.add_argument('--view', action='append', dest='views',
+                            help='Мерить только указанные страницы.')
+
+    def scenarios(self):
+        """Страницы с самыми тяжелыми данными: имя -> (метод, url, data)."""
+        author = (User.objects.filter(stats__post_count__gt=0)
+                  .order_by('-stats__post_count').first())
+        reader = (User.objects.filter(stats__following_count__gt=0)
+                  .order_by('-stats__following_count').first())
+        post = Post.objects.order_by('-comment_count', '-id').first()
+        group = Group.objects.filter(
+            id__in=Post.objects.filter(group__isnull=False)
+            .order_by('-pub_date').values('group')[:1]).first()
+        if not (author and reader and post and group):
+            raise CommandError('База пуста: сначала запустите '
+                               'generate_dataset.')
+        post_kwargs = {'username': post.author.username, 'post_id': post.id}
+        scenarios = {
+            'index': ('get', reverse('index'), None),
+            'group_posts': ('get', reverse('group', args=[group.slug]),
+                            None),
+            'profile': ('get', reverse('profile', args=[author.username]),
+                        None),
+            'post_view': ('get', reverse('post', kwargs=post_kwargs), None),
+            'follow_index': ('get', reverse('follow_index'), None),
+            'add_comment': ('post', reverse('add_comment',
+                                            kwargs=post_kwargs),
+                            {'text': 'Комментарий для замера'}),
+            'new_post': ('post', reverse('new_post'),
+                         {'text': 'Пост для замера', 'group': group.id}),
+            'api_posts': ('get', reverse('api:posts'), None),
+            'api_group_posts': ('get', reverse('api:group_posts',
+                                               args=[group.slug]), None),
+            'api_author_posts': ('get', reverse('api:author_posts',
+                                                args=[author.username]),
+                                 None),
+            'api_post': ('get', reverse('api:post', args=[post.id]), None),
+            'api_follow': ('get', reverse('api:follow'), None),
+        }
+        return reader, scenarios
+
+    def send(self, client, method, url, data):
+        if method == 'get':
+            return client.get(url)
+        # Пишущие запросы не оставляют следов в базе: все изменения
+        # и их on_commit-обработчики откатываются.
+        try:
+            with transaction.atomic():
+                response = client.post(url, data)
+                raise Rollback
+        except Rollback:
+            return response
+
+    def request(self, client, method, url, data, warm_cache):
+        if not warm_cache:
+            cache.clear()
+        # Сборщик мусора запускается непредсказуемо и дает основной
+        # шум в хвосте распределения - на время замера он выключен.
+        gc.disable()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = self.send(client, method, url, data)
+                elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            gc.enable()
+        if response.status_code >= 400:
+            raise CommandError(f'{method.upper()} {url}: '
+                               f'статус {response.status_code}')
+        return elapsed, len(queries), len(response.content)
+
+    def measure(self, client, scenario, repeat, warm_cache):
+        method, url, data = scenario
+        self.request(client, method, url, data, warm_cache)
+        timings = []
+        for _ in range(repeat):
+            elapsed, queries, size = self.request(
+                client, method, url, data, warm_cache)
+            timings.append(elapsed)
+        return {
+            'p50': round(percentile(timings, 0.5), 2),
+            'p95': round(percentile(timings, 0.95), 2),
+            'rps': round(1000 * len(timings) / sum(timings), 1),
+            'queries': queries,
+            'bytes': size,
+        }
+
+    def regressions(self, results, baseline, threshold, slack):
+        problems = []
+        for name, current in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if current['queries'] > expected['queries']:
+                problems.append(f'{name}: запросов {current["queries"]} '
+                                f'вместо {expected["queries"]}')
+            for metric, extra in (('p50', slack), ('p95', slack),
+                                  ('bytes', 0)):
+                limit = expected[metric] * (1 + threshold) + extra
+                if current[metric] > limit:
+                    problems.append(f'{name}: {metric} {current[metric]} '
+                                    f'при эталоне {expected[metric]}')
+        return problems
+
+    def select(self, scenarios, names):
+        if not names:
+            return scenarios
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            raise CommandError('Неизвестные страницы: '
+                               + ', '.join(sorted(unknown)))
+        return {name: scenarios[name] for name in names}
+
+    def run(self, client, scenarios, repeat, warm_cache):
+        self.stdout.write('{:<18}{:>10}{:>10}{:>9}{:>10}{:>9}'.format(
+            'view', 'p50 ms', 'p95 ms', 'queries', 'bytes', 'req/s'))
+        results = {}
+        for name, scenario in scenarios.items():
+            results[name] = self.measure(client, scenario, repeat,
+                                         warm_cache)
+            self.stdout.write('{:<18}{p50:>10.2f}{p95:>10.2f}'
+                              '{queries:>9}{bytes:>10}{rps:>9.1f}'.format(
+                                  name, **results[name]))
+        for api, html in COUNTERPARTS.items():
+            if api in results and html in results:
+                self.stdout.write('{} / {}: x{:.1f} req/s'.format(
+                    api, html, results[api]['rps'] / results[html]['rps']))
+        return results
+
+    def save(self, path, dataset, results):
+        with open(path, 'w') as baseline_file:
+            json.dump({'dataset': dataset, 'views': results},
+                      baseline_file, indent=2, sort_keys=True)
+        self.stdout.write(f'Эталон записан в {path}')
+
+    def compare(self, path, dataset, results, threshold, slack):
+        try:
+            with open(path) as baseline_file:
+                baseline = json.load(baseline_file)
+        except FileNotFoundError:
+            self.stdout.write(f'Эталона {path} нет, сравнивать не с чем.')
+            return
+        if baseline['dataset'] != dataset:
+            self.stdout.write(self.style.WARNING(
+                f'Эталон снят на другом наборе данных: '
+                f'{baseline["dataset"]}'))
+        problems = self.regressions(results, baseline['views'],
+                                    threshold, slack)
+        if problems:
+            raise CommandError('Регрессии:\n  ' + '\n  '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def handle(self, *args, **options):
+        reader, scenarios = self.scenarios()
+        scenarios = self.select(scenarios, options['views'])
+        client = Client()
+        client.force_login(reader)
+
+        dataset = {'users': User.objects.count(),
+                   'posts': Post.objects.count()}
+        self.stdout.write(f'Пользователей: {dataset["users"]}, '
+                          f'постов: {dataset["posts"]}, '
+                          f'{options["repeat"]} замеров на страницу')
+        results = self.run(client, scenarios, options['repeat'],
+                           options['warm_cache'])
+        if options['save']:
+            self.save(options['baseline'], dataset, results)
+        else:
+            self.compare(options['baseline'], dataset, results,
+                         options['threshold'], options['slack'])
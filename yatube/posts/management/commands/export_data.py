@@ -0,0 +1,46 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORTS, FORMATS, stream
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты, комментарии или подписки в JSONL '
+            'или CSV; память не зависит от размера таблицы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS),
+                            default='jsonl')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжимать gzip; включается и по '
+                                 'расширению .gz у --output.')
+        parser.add_argument('-o', '--output',
+                            help='Файл выгрузки; по умолчанию stdout.')
+        parser.add_argument('--chunk', type=int, default=2000,
+                            help='Строк на одно чтение из базы.')
+
+    def handle(self, *args, **options):
+        path = options['output']
+        compress = options['gzip'] or bool(path and path.endswith('.gz'))
+        try:
+            output = open(path, 'wb') if path else sys.stdout.buffer
+        except OSError as exc:
+            raise CommandError(exc)
+        started = time.perf_counter()
+        written = 0
+        try:
+            for data in stream(options['name'], options['format'],
+                               compress, options['chunk']):
+                output.write(data)
+                written += len(data)
+        finally:
+            if path:
+                output.close()
+            else:
+                output.flush()
+        if path:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{path}: {written} байт за {elapsed:.1f} с')
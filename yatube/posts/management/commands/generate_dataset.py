@@ -0,0 +1,215 @@
+import datetime as dt
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts import caching, search
+from posts.bulk import chunked, manual_dates, next_id
+from posts.models import (AuthorStats, Comment, FeedEntry, Follow, Group,
+                          Post, User)
+
+WORDS = (
+    'котик лето город море книга утро вечер дорога песня друг кофе '
+    'дождь солнце горы лес поезд работа отпуск кино музыка фото '
+    'история новость праздник проект идея мечта неделя выходные'
+).split()
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными для нагрузочных тестов: '
+            'пользователи, группы, посты, комментарии и подписки со '
+            'степенным распределением популярности авторов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=50000)
+        parser.add_argument('--alpha', type=float, default=1.2,
+                            help='Показатель степени распределения '
+                                 'Парето: чем меньше, тем сильнее '
+                                 'выделяются популярные авторы.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить посты.')
+        parser.add_argument('--chunk', type=int, default=10000,
+                            help='Строк на одну транзакцию.')
+        parser.add_argument('--password', default=None,
+                            help='Общий пароль пользователей; '
+                                 'по умолчанию вход по паролю закрыт.')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--skip-feeds', action='store_true',
+                            help='Не материализовать ленты подписок.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.chunk = options['chunk']
+        self.alpha = options['alpha']
+        self.started = time.perf_counter()
+        with search.suspended(), manual_dates(
+                Post._meta.get_field('pub_date'),
+                Comment._meta.get_field('created')):
+            users = self.create_users(options['users'], options['password'])
+            groups = self.create_groups(options['groups'])
+            posts = self.create_posts(options['posts'], users, groups,
+                                      options['days'])
+            self.create_comments(options['comments'], users, posts,
+                                 options['days'])
+            self.create_follows(options['follows'], users)
+        self.log('пересобран поисковый индекс')
+
+        self.step('счетчики авторов', AuthorStats.objects.rebuild_all)
+        self.step('счетчики комментариев',
+                  Post.objects.rebuild_comment_counts)
+        if not options['skip_feeds']:
+            self.build_feeds(users)
+        caching.bump(caching.SITE)
+
+    def log(self, message):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f'[{elapsed:8.1f}s] {message}')
+
+    def step(self, name, func):
+        func()
+        self.log(f'пересобраны {name}')
+
+    def insert(self, model, objects, total):
+        """Потоково вставляет объекты пачками по транзакциям."""
+        inserted = 0
+        for batch in chunked(objects, self.chunk):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            inserted += len(batch)
+            self.log(f'{model.__name__}: {inserted}/{total}')
+
+    def weights(self, size):
+        """Кумулятивные веса популярности по закону Парето."""
+        return list(itertools.accumulate(
+            self.rng.paretovariate(self.alpha) for _ in range(size)))
+
+    @staticmethod
+    def quotas(weights, total, limit):
+        """
+        Делит total пропорционально весам, но не больше limit на одного:
+        излишек упершихся в предел переходит к остальным.
+        """
+        shares = [0.0] * len(weights)
+        free = set(range(len(weights)))
+        remaining = total
+        while free and remaining > 0:
+            scale = remaining / sum(weights[i] for i in free)
+            capped = {i for i in free if weights[i] * scale >= limit}
+            if not capped:
+                for i in free:
+                    shares[i] = weights[i] * scale
+                break
+            for i in capped:
+                shares[i] = limit
+            remaining -= limit * len(capped)
+            free -= capped
+        return shares
+
+    def create_users(self, count, password):
+        first = next_id(User)
+        password = make_password(password)
+        now = timezone.now()
+        self.insert(User, (
+            User(id=first + number, username=f'user{first + number}',
+                 password=password, date_joined=now)
+            for number in range(count)
+        ), count)
+        return range(first, first + count)
+
+    def create_groups(self, count):
+        first = next_id(Group)
+        self.insert(Group, (
+            Group(id=first + number, title=f'Группа {first + number}',
+                  slug=f'group-{first + number}',
+                  description=self.text())
+            for number in range(count)
+        ), count)
+        return range(first, first + count)
+
+    def create_posts(self, count, users, groups, days):
+        first = next_id(Post)
+        authors = self.weights(len(users))
+        start = timezone.now() - dt.timedelta(days=days)
+        step = dt.timedelta(days=days) / max(count, 1)
+
+        def posts():
+            for number in range(count):
+                # Посты идут по времени, но без равных интервалов
+                jitter = step * self.rng.random()
+                group = self.rng.choice(groups) if (
+                    groups and self.rng.random() < 0.5) else None
+                yield Post(
+                    id=first + number,
+                    text=self.text(),
+                    pub_date=start + step * number + jitter,
+                    author_id=self.rng.choices(
+                        users, cum_weights=authors)[0],
+                    group_id=group,
+                )
+        self.insert(Post, posts(), count)
+        return range(first, first + count)
+
+    def create_comments(self, count, users, posts, days):
+        if not posts:
+            return
+        now = timezone.now()
+        start = now - dt.timedelta(days=days)
+        step = dt.timedelta(days=days) / len(posts)
+
+        def comments():
+            for _ in range(count):
+                number = self.rng.randrange(len(posts))
+                # Комментарий пишется после поста, чаще вскоре после него
+                written = start + step * (number + 1)
+                yield Comment(
+                    post_id=posts[number],
+                    author_id=self.rng.choice(users),
+                    text=self.text(),
+                    created=written + (now - written) * self.rng.random() ** 3,
+                )
+        self.insert(Comment, comments(), count)
+
+    def create_follows(self, count, users):
+        if len(users) < 2:
+            return
+        authors = self.weights(len(users))
+        quotas = self.quotas(
+            [self.rng.paretovariate(self.alpha) for _ in users],
+            count, len(users) // 2)
+
+        def follows():
+            for user_id, share in zip(users, quotas):
+                # Вероятностное округление сохраняет ожидаемую сумму
+                wanted = int(share) + (self.rng.random() < share % 1)
+                chosen = set()
+                while len(chosen) < wanted:
+                    chosen.update(self.rng.choices(
+                        users, cum_weights=authors, k=wanted - len(chosen)))
+                    chosen.discard(user_id)
+                for author_id in chosen:
+                    yield Follow(user_id=user_id, author_id=author_id)
+        self.insert(Follow, follows(), count)
+
+    def build_feeds(self, users):
+        """
+        Ленты нужны только новым пользователям: на их подписки и посты
+        прежние пользователи не подписаны. Каждая пачка - своя транзакция.
+        """
+        built = 0
+        for batch in chunked(users, 500):
+            with transaction.atomic():
+                FeedEntry.objects.build(batch)
+            built += len(batch)
+            self.log(f'ленты подписок: {built}/{len(users)}')
+
+    def text(self):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(5, 40)))
@@ -0,0 +1,264 @@
+import csv
+import json
+import sys
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import caching, search
+from posts.bulk import chunked, manual_dates, next_id
+from posts.models import AuthorStats, Comment, FeedEntry, Group, Post, User
+
+MAX_REPORTED_ERRORS = 20
+# Значений в одном IN (...): старые SQLite не принимают больше 999
+# параметров в запросе
+LOOKUP_BATCH = 500
+
+
+class RecordError(ValueError):
+    """Запись нельзя импортировать."""
+
+
+class Command(BaseCommand):
+    help = ('Потоково загружает посты и комментарии из JSONL или CSV. '
+            'Запись поста: type=post, id (необязателен), author, text, '
+            'group, pub_date. Запись комментария: type=comment, post, '
+            'author, text, created. Комментарий может ссылаться на пост '
+            'из того же файла, если тот идет раньше.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл для импорта; - читает stdin.')
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            help='По умолчанию - по расширению файла.')
+        parser.add_argument('--chunk', type=int, default=5000,
+                            help='Записей на одну транзакцию.')
+        parser.add_argument('--create-missing', action='store_true',
+                            help='Заводить неизвестных авторов и группы.')
+        parser.add_argument('--strict', action='store_true',
+                            help='Останавливаться на первой ошибочной '
+                                 'записи.')
+
+    def handle(self, *args, **options):
+        self.strict = options['strict']
+        self.create_missing = options['create_missing']
+        self.authors = {}
+        self.groups = {}
+        self.post_id = next_id(Post)
+        self.errors = 0
+        self.imported = {'post': 0, 'comment': 0}
+        self.committed = 0
+        self.started = time.perf_counter()
+
+        source = self.open(options['path'])
+        try:
+            records = self.read(source, options['format']
+                                or self.guess_format(options['path']))
+            # bulk_create не шлет сигналов, так что счетчики, ленты и
+            # кеш не трогаются по записи; поисковые триггеры снимаются.
+            with search.suspended(), manual_dates(
+                    Post._meta.get_field('pub_date'),
+                    Comment._meta.get_field('created')):
+                for chunk in chunked(records, options['chunk']):
+                    self.import_chunk(chunk)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            # Пачки до упавшей уже в базе, производные данные нужны и им
+            if self.committed:
+                self.rebuild()
+
+        total = sum(self.imported.values())
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов: {self.imported["post"]}, '
+            f'комментариев: {self.imported["comment"]}, '
+            f'пропущено: {self.errors}; {elapsed:.1f} с, '
+            f'{total / elapsed:.0f} записей/с'))
+
+    def rebuild(self):
+        self.log('пересобран поисковый индекс')
+        AuthorStats.objects.rebuild_all()
+        Post.objects.rebuild_comment_counts()
+        self.log('пересобраны счетчики')
+        FeedEntry.objects.rebuild_all()
+        self.log('пересобраны ленты подписок')
+        caching.bump(caching.SITE)
+
+    def open(self, path):
+        if path == '-':
+            return sys.stdin
+        try:
+            return open(path, newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(exc)
+
+    def guess_format(self, path):
+        if path.endswith('.csv'):
+            return 'csv'
+        if path.endswith(('.jsonl', '.json')):
+            return 'jsonl'
+        raise CommandError('Не удалось понять формат, укажите --format.')
+
+    def read(self, source, fmt):
+        """Записи файла в виде (номер строки, словарь или ошибка)."""
+        if fmt == 'csv':
+            reader = csv.DictReader(source)
+            for record in reader:
+                # Пустые ячейки CSV - то же, что отсутствующие ключи JSON
+                yield reader.line_num, {
+                    key: value for key, value in record.items() if value}
+            return
+        for number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('ожидался объект')
+            except ValueError as exc:
+                record = RecordError(f'неверный JSON: {exc}')
+            yield number, record
+
+    def log(self, message):
+        elapsed = time.perf_counter() - self.started
+        total = sum(self.imported.values())
+        self.stdout.write(f'[{elapsed:8.1f}s] {total} записей, '
+                          f'{total / elapsed:.0f}/с: {message}')
+
+    def reject(self, number, error):
+        if self.strict:
+            raise CommandError(f'Строка {number}: {error}')
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f'Строка {number}: {error}')
+
+    def import_chunk(self, chunk):
+        records = []
+        for number, record in chunk:
+            if isinstance(record, RecordError):
+                self.reject(number, record)
+            else:
+                records.append((number, record))
+        first, last = chunk[0][0], chunk[-1][0]
+        try:
+            with transaction.atomic():
+                self.resolve(records)
+                posts, comments = self.build(records)
+                Post.objects.bulk_create(posts)
+                comments = self.existing_posts(comments)
+                Comment.objects.bulk_create(comments)
+        except IntegrityError as exc:
+            raise CommandError(f'Строки {first}-{last}: {exc}')
+        self.committed += 1
+        self.imported['post'] += len(posts)
+        self.imported['comment'] += len(comments)
+        self.log(f'строка {last}')
+
+    def resolve(self, records):
+        """Заполняет кеш id авторов и групп для записей пачки."""
+        usernames = {record.get('author') for _, record in records} - {None}
+        slugs = {record.get('group') for _, record in records
+                 if record.get('type', 'post') == 'post'} - {None}
+        self.lookup(User, 'username', usernames, self.authors,
+                    self.new_users)
+        self.lookup(Group, 'slug', slugs, self.groups, self.new_groups)
+
+    def lookup(self, model, field, values, cache, create):
+        missing = [value for value in values if value not in cache]
+        if not missing:
+            return
+        for batch in chunked(missing, LOOKUP_BATCH):
+            cache.update(model.objects.filter(**{field + '__in': batch})
+                         .values_list(field, 'id'))
+        missing = [value for value in missing if value not in cache]
+        if missing and self.create_missing:
+            first = next_id(model)
+            model.objects.bulk_create(create(first, missing))
+            cache.update(zip(missing, range(first, first + len(missing))))
+
+    def new_users(self, first, usernames):
+        password = make_password(None)
+        now = timezone.now()
+        return [User(id=first + number, username=username,
+                     password=password, date_joined=now)
+                for number, username in enumerate(usernames)]
+
+    def new_groups(self, first, slugs):
+        return [Group(id=first + number, slug=slug, title=slug,
+                      description='')
+                for number, slug in enumerate(slugs)]
+
+    def build(self, records):
+        posts, comments = [], []
+        for number, record in records:
+            try:
+                if record.get('type', 'post') == 'post':
+                    posts.append(self.build_post(record))
+                elif record['type'] == 'comment':
+                    comments.append((number, self.build_comment(record)))
+                else:
+                    raise RecordError(f'неизвестный тип {record["type"]}')
+            except (RecordError, ValueError, TypeError) as exc:
+                self.reject(number, exc)
+        return posts, comments
+
+    def build_post(self, record):
+        group = record.get('group')
+        if group is not None and group not in self.groups:
+            raise RecordError(f'нет группы {group}')
+        post_id = int(record['id']) if record.get('id') else self.post_id
+        self.post_id = max(self.post_id, post_id + 1)
+        return Post(id=post_id, author_id=self.author_id(record),
+                    group_id=self.groups.get(group),
+                    text=self.text(record),
+                    pub_date=self.date(record, 'pub_date'))
+
+    def build_comment(self, record):
+        if not record.get('post'):
+            raise RecordError('не указан пост')
+        return Comment(post_id=int(record['post']),
+                       author_id=self.author_id(record),
+                       text=self.text(record),
+                       created=self.date(record, 'created'))
+
+    def existing_posts(self, comments):
+        """Комментарии к существующим постам; остальные - ошибки."""
+        post_ids = {comment.post_id for _, comment in comments}
+        existing = set()
+        for batch in chunked(post_ids, LOOKUP_BATCH):
+            existing.update(Post.objects.filter(id__in=batch)
+                            .values_list('id', flat=True))
+        kept = []
+        for number, comment in comments:
+            if comment.post_id in existing:
+                kept.append(comment)
+            else:
+                self.reject(number, f'нет поста {comment.post_id}')
+        return kept
+
+    def author_id(self, record):
+        author = record.get('author')
+        if author not in self.authors:
+            raise RecordError(f'нет автора {author}')
+        return self.authors[author]
+
+    def text(self, record):
+        text = record.get('text')
+        if not isinstance(text, str) or not text.strip():
+            raise RecordError('пустой текст')
+        return text
+
+    def date(self, record, field):
+        value = record.get(field)
+        if not value:
+            return timezone.now()
+        date = parse_datetime(value)
+        if date is None:
+            raise RecordError(f'неверная дата {field}: {value}')
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date, timezone.utc)
+        return date
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import AuthorStats, Post
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает счетчики записей и подписок авторов '
+            'и счетчики комментариев постов; с --verify только сверяет '
+            'счетчики авторов с таблицами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            total = AuthorStats.objects.rebuild_all()
+            self.stdout.write(f'Пересчитано авторов: {total}')
+            total = Post.objects.rebuild_comment_counts()
+            self.stdout.write(f'Пересчитано постов: {total}')
+            return
+        mismatches = AuthorStats.objects.verify_all()
+        for user_id, field, stored, actual in mismatches:
+            self.stdout.write(
+                f'user {user_id}: {field} = {stored}, ожидалось {actual}')
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        self.stdout.write('Счетчики совпадают с таблицами')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает материализованные ленты подписок; '
+            'с --trim только обрезает их до FEED_MAX_LENGTH.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trim', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['trim']:
+            FeedEntry.objects.trim_all()
+        else:
+            FeedEntry.objects.rebuild_all()
+        self.stdout.write(f'Записей в лентах: {FeedEntry.objects.count()}')
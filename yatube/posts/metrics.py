@@ -0,0 +1,292 @@
+"""
+Метрики запросов в формате Prometheus.
+
+MetricsMiddleware считает для каждого имени маршрута число запросов,
+гистограмму времени ответа, число и время SQL-запросов, попадания и
+промахи кеша и время рендеринга шаблонов. Кеш и шаблоны учитываются
+через backend-ы из этого модуля, подключенные в settings.
+
+Каждый процесс копит значения у себя и раз в METRICS_FLUSH_INTERVAL
+секунд сбрасывает их в свой файл в METRICS_DIR; /metrics суммирует файлы
+всех процессов. Все значения монотонные (гистограмма хранится
+накопленными корзинами), поэтому сумма по процессам корректна, а файлы
+завершившихся процессов не портят счетчики. Каталог стоит очищать при
+перезапуске сервиса. Без METRICS_DIR видны только данные текущего
+процесса.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache.backends import filebased, locmem, memcached
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+FAMILIES = {
+    'yatube_requests_total': (
+        'counter', 'Запросы по маршруту, методу и статусу.'),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа.'),
+    'yatube_db_queries_total': (
+        'counter', 'SQL-запросы.'),
+    'yatube_db_query_seconds_total': (
+        'counter', 'Время SQL-запросов.'),
+    'yatube_cache_hits_total': (
+        'counter', 'Попадания в кеш.'),
+    'yatube_cache_misses_total': (
+        'counter', 'Промахи кеша.'),
+    'yatube_template_render_seconds_total': (
+        'counter', 'Время рендеринга шаблонов.'),
+}
+
+_MISSING = object()
+_local = threading.local()
+
+
+class Registry:
+    """Значения метрик процесса: (имя, метки) -> число."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = defaultdict(float)
+        self.path = None
+        self.flushed_at = 0
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] += amount
+
+    def observe(self, name, labels, value):
+        for bound in BUCKETS:
+            self.inc(name + '_bucket', dict(labels, le=str(bound)),
+                     int(value <= bound))
+        self.inc(name + '_bucket', dict(labels, le='+Inf'))
+        self.inc(name + '_sum', labels, value)
+        self.inc(name + '_count', labels)
+
+    def snapshot(self):
+        with self.lock:
+            return [[name, list(labels), value]
+                    for (name, labels), value in self.values.items()]
+
+    def flush(self, force=False):
+        """Записывает значения процесса в его файл в METRICS_DIR."""
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or (
+                not force
+                and now - self.flushed_at < settings.METRICS_FLUSH_INTERVAL):
+            return
+        self.flushed_at = now
+        if self.path is None:
+            # pid может достаться следующему процессу, поэтому в имени
+            # файла есть еще и случайная часть.
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(
+                directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(temporary, self.path)
+
+    def collect(self):
+        """Сумма значений всех процессов."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return self.snapshot()
+        self.flush(force=True)
+        totals = defaultdict(float)
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            except (OSError, ValueError):
+                continue
+            for metric, labels, value in snapshot:
+                totals[metric, tuple(map(tuple, labels))] += value
+        return [[name, list(labels), value]
+                for (name, labels), value in totals.items()]
+
+
+registry = Registry()
+atexit.register(registry.flush, force=True)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - started
+
+
+def _current():
+    return getattr(_local, 'stats', None)
+
+
+def count_cache(hits, misses):
+    stats = _current()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = _local.stats = RequestStats()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = {'view': match.view_name if match else '<unresolved>'}
+        registry.inc('yatube_requests_total', dict(
+            view, method=request.method, status=str(response.status_code)))
+        registry.observe('yatube_request_duration_seconds', view, elapsed)
+        registry.inc('yatube_db_queries_total', view, stats.queries)
+        registry.inc('yatube_db_query_seconds_total', view, stats.query_time)
+        registry.inc('yatube_cache_hits_total', view, stats.cache_hits)
+        registry.inc('yatube_cache_misses_total', view, stats.cache_misses)
+        registry.inc('yatube_template_render_seconds_total', view,
+                     stats.template_time)
+        registry.flush()
+        return response
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _family(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+            return name[:-len(suffix)]
+    return name
+
+
+def exposition(samples):
+    """Текст в формате Prometheus для списка [имя, метки, значение]."""
+    def bucket_order(sample):
+        name, labels, value = sample
+        labels = dict(labels)
+        le = labels.pop('le', None)
+        bound = float(le) if le is not None else 0
+        return _family(name), sorted(labels.items()), name, bound
+
+    lines = []
+    family = None
+    for name, labels, value in sorted(samples, key=bucket_order):
+        if _family(name) != family:
+            family = _family(name)
+            kind, description = FAMILIES.get(family, ('untyped', ''))
+            lines.append(f'# HELP {family} {description}')
+            lines.append(f'# TYPE {family} {kind}')
+        label_text = ','.join(f'{key}="{_escape(value)}"'
+                              for key, value in labels)
+        if label_text:
+            label_text = '{' + label_text + '}'
+        number = int(value) if float(value).is_integer() else value
+        lines.append(f'{name}{label_text} {number}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    if not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(exposition(registry.collect()),
+                        content_type='text/plain; version=0.0.4')
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats = _current()
+            if stats is not None:
+                stats.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Шаблоны Django с учетом времени рендеринга в метриках запроса."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class CountingCacheMixin:
+    """Считает попадания и промахи кеша для метрик запроса."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if getattr(_local, 'in_get_many', False):
+            return default if value is _MISSING else value
+        if value is _MISSING:
+            count_cache(0, 1)
+            return default
+        count_cache(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        # Базовый get_many ходит через get - не считаем ключи дважды.
+        _local.in_get_many = True
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            _local.in_get_many = False
+        count_cache(len(found), len(keys) - len(found))
+        return found
+
+
+class LocMemCache(CountingCacheMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(CountingCacheMixin, filebased.FileBasedCache):
+    pass
+
+
+class MemcachedCache(CountingCacheMixin, memcached.MemcachedCache):
+    pass
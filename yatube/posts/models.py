@@ -1,9 +1,34 @@
-from django.db import models
+import json
+
+from django.db import connection, models, transaction
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Coalesce
+
+from .bulk import chunked
 
 User = get_user_model()
 
 
+class PostManager(models.Manager):
+    def rebuild_comment_counts(self):
+        """
+        Пересчитывает comment_count и last_comment_at всех постов одним
+        UPDATE.
+        """
+        comments = Comment.objects.filter(
+            post=models.OuterRef('pk')
+        ).order_by().values('post')
+        total = comments.annotate(total=models.Count('id')).values('total')
+        last = comments.annotate(last=models.Max('created')).values('last')
+        return self.update(
+            comment_count=Coalesce(
+                models.Subquery(total, output_field=models.IntegerField()),
+                0),
+            last_comment_at=models.Subquery(
+                last, output_field=models.DateTimeField()))
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField('date published', auto_now_add=True)
@@ -19,13 +44,36 @@ class Post(models.Model):
         null=True,
     )
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # JSON-описание адаптивных вариантов картинки, см. posts.images
+    image_variants = models.TextField(blank=True, default='', editable=False)
+    # По времени правки поста и последнего изменения его комментариев
+    # версионируются закешированные части страницы поста
+    updated = models.DateTimeField('date updated', auto_now=True)
+    last_comment_at = models.DateTimeField(null=True, blank=True,
+                                           editable=False)
+
+    objects = PostManager()
 
     class Meta:
         ordering = ['-pub_date']
+        # id - это rowid, SQLite хранит его последним ключом каждого
+        # индекса, поэтому сортировка ленты (pub_date, id) идет по индексу
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def variants(self):
+        return json.loads(self.image_variants) if self.image_variants else []
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -41,6 +89,12 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField('Date published', auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -58,6 +112,11 @@ class Follow(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_follow')]
+        # Покрывающий индекс: подписчики автора без чтения таблицы
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
 
 
 class Group(models.Model):
@@ -67,3 +126,259 @@ class Group(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class AuthorStatsManager(models.Manager):
+    def count_for(self, user_id):
+        """Честно пересчитывает счетчики автора по таблицам."""
+        return {
+            'post_count': Post.objects.filter(author_id=user_id).count(),
+            'follower_count': Follow.objects.filter(
+                author_id=user_id).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id).count(),
+        }
+
+    def for_user(self, user):
+        """Счетчики автора; отсутствующую запись создает пересчетом."""
+        try:
+            return user.stats
+        except AuthorStats.DoesNotExist:
+            stats, _ = self.get_or_create(
+                user=user, defaults=self.count_for(user.id))
+            return stats
+
+    def bump(self, user_id, **deltas):
+        """Атомарно сдвигает счетчики, например bump(1, post_count=-1)."""
+        self.filter(user_id=user_id).update(
+            **{field: models.F(field) + delta
+               for field, delta in deltas.items()})
+
+    def _count_all(self):
+        def grouped(queryset, field):
+            return dict(queryset.values(field).annotate(
+                total=models.Count('id')).values_list(field, 'total'))
+
+        posts = grouped(Post.objects.order_by(), 'author')
+        followers = grouped(Follow.objects.order_by(), 'author')
+        followings = grouped(Follow.objects.order_by(), 'user')
+        for user_id in User.objects.values_list('id', flat=True).iterator():
+            yield AuthorStats(
+                user_id=user_id,
+                post_count=posts.get(user_id, 0),
+                follower_count=followers.get(user_id, 0),
+                following_count=followings.get(user_id, 0),
+            )
+
+    def rebuild_all(self, batch_size=500):
+        """Пересобирает счетчики всех пользователей, возвращает их число."""
+        total = 0
+        with transaction.atomic():
+            self.all().delete()
+            batch = []
+            for stats in self._count_all():
+                batch.append(stats)
+                if len(batch) >= batch_size:
+                    self.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            self.bulk_create(batch)
+        return total + len(batch)
+
+    def verify_all(self):
+        """Список расхождений (user_id, поле, сохранено, на самом деле)."""
+        stored = {stats.user_id: stats for stats in self.all()}
+        mismatches = []
+        for actual in self._count_all():
+            current = stored.get(actual.user_id)
+            if current is None:
+                continue
+            for field in AuthorStats.COUNTERS:
+                if getattr(current, field) != getattr(actual, field):
+                    mismatches.append((actual.user_id, field,
+                                       getattr(current, field),
+                                       getattr(actual, field)))
+        return mismatches
+
+
+class AuthorStats(models.Model):
+    COUNTERS = ('post_count', 'follower_count', 'following_count')
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    post_count = models.PositiveIntegerField(default=0)
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    objects = AuthorStatsManager()
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_count}/{self.follower_count}'
+
+
+class FeedEntryManager(models.Manager):
+    def fan_out(self, post, batch_size=500):
+        """
+        Раскладывает новый пост в ленты всех подписчиков автора и сразу
+        обрезает их, чтобы ленты не росли между пересборками.
+        """
+        followers = Follow.objects.filter(
+            author_id=post.author_id
+        ).values_list('user_id', flat=True).iterator()
+        # Внутри транзакции new_post точка сохранения не нужна: ошибка
+        # откатит запрос целиком
+        with transaction.atomic(savepoint=False):
+            batch = []
+            for user_id in followers:
+                batch.append(user_id)
+                if len(batch) >= batch_size:
+                    self._add_post(post, batch)
+                    batch = []
+            self._add_post(post, batch)
+
+    def _add_post(self, post, user_ids):
+        if not user_ids:
+            return
+        self.bulk_create(
+            [FeedEntry(user_id=user_id, post_id=post.id,
+                       author_id=post.author_id, pub_date=post.pub_date)
+             for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        self.trim_many(user_ids)
+
+    def backfill(self, user_id, author_id):
+        """Добавляет в ленту свежие посты автора, на которого подписались."""
+        posts = Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', 'pub_date')[:settings.FEED_MAX_LENGTH]
+        self.bulk_create(
+            [FeedEntry(user_id=user_id, post_id=post_id,
+                       author_id=author_id, pub_date=pub_date)
+             for post_id, pub_date in posts],
+            ignore_conflicts=True,
+        )
+        self.trim(user_id)
+
+    def prune(self, user_id, author_id):
+        self.filter(user_id=user_id, author_id=author_id).delete()
+
+    def trim(self, user_id):
+        """Оставляет в ленте не больше FEED_MAX_LENGTH последних постов."""
+        self.trim_many([user_id])
+
+    def trim_many(self, user_ids):
+        """
+        Обрезает ленты нескольких пользователей одним DELETE. Для каждой
+        ленты по индексу (user, pub_date) ищется запись номер
+        FEED_MAX_LENGTH + 1; удаляется она и все, что старше. Ленты не
+        длиннее предела стоят один поиск по индексу и не сортируются.
+        """
+        feed = self.model._meta.db_table
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        sql = f'''
+            DELETE FROM {feed} WHERE id IN (
+                SELECT stale.id
+                FROM {feed} edge
+                JOIN {feed} stale ON stale.user_id = edge.user_id
+                    AND stale.pub_date <= edge.pub_date
+                    AND (stale.pub_date < edge.pub_date
+                         OR stale.id <= edge.id)
+                WHERE edge.id IN (
+                    SELECT (
+                        SELECT entry.id FROM {feed} entry
+                        WHERE entry.user_id = reader.id
+                        ORDER BY entry.pub_date DESC, entry.id DESC
+                        LIMIT 1 OFFSET %s
+                    )
+                    FROM {User._meta.db_table} reader
+                    WHERE reader.id IN ({placeholders})
+                )
+            )
+        '''
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [settings.FEED_MAX_LENGTH, *user_ids])
+
+    def trim_all(self, batch_size=500):
+        user_ids = self.order_by().values_list(
+            'user_id', flat=True).distinct()
+        batch = []
+        for user_id in user_ids.iterator():
+            batch.append(user_id)
+            if len(batch) >= batch_size:
+                self.trim_many(batch)
+                batch = []
+        if batch:
+            self.trim_many(batch)
+
+    def build(self, user_ids):
+        """
+        Собирает ленты пользователей, у которых их еще нет: каждому
+        достаются FEED_MAX_LENGTH последних постов его авторов. Выборка
+        с LIMIT по каждому читателю не сортирует все посты всех подписок.
+        """
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        sql = f'''
+            INSERT INTO {self.model._meta.db_table}
+                (user_id, post_id, author_id, pub_date)
+            SELECT reader.id, post.id, post.author_id, post.pub_date
+            FROM {User._meta.db_table} reader
+            JOIN {Post._meta.db_table} post ON post.id IN (
+                SELECT latest.id
+                FROM {Follow._meta.db_table} follow
+                JOIN {Post._meta.db_table} latest
+                    ON latest.author_id = follow.author_id
+                WHERE follow.user_id = reader.id
+                ORDER BY latest.pub_date DESC, latest.id DESC
+                LIMIT %s
+            )
+            WHERE reader.id IN ({placeholders})
+        '''
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [settings.FEED_MAX_LENGTH, *user_ids])
+
+    def rebuild_all(self, batch_size=500):
+        """Пересобирает все ленты, по batch_size читателей за запрос."""
+        readers = list(Follow.objects.order_by().values_list(
+            'user_id', flat=True).distinct())
+        with transaction.atomic():
+            self.all().delete()
+            for batch in chunked(readers, batch_size):
+                self.build(batch)
+
+
+class FeedEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    objects = FeedEntryManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_feed_entry')]
+        indexes = [
+            models.Index(fields=['user', 'pub_date'],
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
@@ -0,0 +1,190 @@
+import base64
+import binascii
+import datetime as dt
+import hashlib
+import json
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+COUNT_KEY = 'count:{}'
+# Номера страниц больше этого заведомо за концом любой ленты, а OFFSET
+# для них может не влезть в целое SQLite
+MAX_PAGE = 2 ** 31
+
+
+class KeysetPaginator(Paginator):
+    """
+    Паджинатор по ключу сортировки вместо LIMIT/OFFSET.
+
+    Записи упорядочены по убыванию ``keys`` (последний ключ должен быть
+    уникальным), соседние страницы запрашиваются через непрозрачные
+    курсоры ``?after=`` и ``?before=``, поэтому глубина страницы
+    не влияет на стоимость запроса. ``?page=N`` по-прежнему работает
+    через смещение - для прямых ссылок на номер страницы.
+
+    COUNT(*) при выдаче страницы не нужен: соседей видно из выборки
+    per_page + 1. Общее число записей понадобится только для ссылки на
+    последнюю страницу в окне ``page.window`` - оно приблизительное и
+    берется из кеша на PAGE_COUNT_CACHE_TIMEOUT секунд.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 transform=None, window=2, **kwargs):
+        self.keys = tuple(keys)
+        self.transform = transform
+        self.window = window
+        self._key_getter = attrgetter(*self.keys)
+        object_list = object_list.order_by(*('-' + key for key in self.keys))
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        """Приблизительное число записей из кеша."""
+        count = cache.get(self._count_key())
+        if count is None:
+            count = self._exact_count()
+        return count
+
+    def _count_key(self):
+        query = str(self.object_list.query).encode()
+        return COUNT_KEY.format(hashlib.md5(query).hexdigest())
+
+    def _exact_count(self):
+        count = self.object_list.order_by().count()
+        cache.set(self._count_key(), count,
+                  settings.PAGE_COUNT_CACHE_TIMEOUT)
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+        return count
+
+    def page_window(self, number, has_next):
+        """
+        Номера страниц вокруг текущей, первая и последняя; None - пропуск.
+        Последняя страница известна точно, только если дальше ничего нет.
+        """
+        last = max(self.num_pages, number + 1) if has_next else number
+        start = max(number - self.window, 1)
+        end = min(number + self.window, last)
+        window = list(range(start, end + 1))
+        if start > 1:
+            window[:0] = [1, None] if start > 2 else [1]
+        if end < last:
+            window += [None, last] if end < last - 1 else [last]
+        return window
+
+    def encode_cursor(self, number, key):
+        if len(self.keys) == 1:
+            key = (key, )
+        values = [value.isoformat() if isinstance(value, dt.datetime)
+                  else value for value in key]
+        raw = json.dumps([number, *values])
+        return base64.urlsafe_b64encode(raw.encode()).rstrip(b'=').decode()
+
+    def decode_cursor(self, cursor):
+        """Возвращает (номер страницы, значения ключей) или None."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            number, *values = json.loads(raw.decode())
+            if len(values) != len(self.keys):
+                return None
+            model = self.object_list.model
+            values = [model._meta.get_field(key).to_python(value)
+                      for key, value in zip(self.keys, values)]
+            return min(max(int(number), 1), MAX_PAGE), values
+        except (binascii.Error, UnicodeDecodeError, ValueError,
+                TypeError, OverflowError, ValidationError):
+            return None
+
+    def _seek(self, values, lookup):
+        """Условие "строго после ключа" в лексикографическом порядке."""
+        condition = Q()
+        for i, key in enumerate(self.keys):
+            step = Q(**{key + '__' + lookup: values[i]})
+            for prev_key, prev_value in zip(self.keys[:i], values[:i]):
+                step &= Q(**{prev_key: prev_value})
+            condition |= step
+        # Избыточная граница по первому ключу: по OR-условию SQLite
+        # не умеет начинать чтение индекса с середины.
+        return Q(**{self.keys[0] + '__' + lookup + 'e': values[0]}) & condition
+
+    def _build_page(self, rows, number, has_next, has_previous):
+        first_key = self._key_getter(rows[0]) if rows else None
+        last_key = self._key_getter(rows[-1]) if rows else None
+        if self.transform is not None:
+            rows = [self.transform(row) for row in rows]
+        page = Page(rows, number, self)
+        # Страница остается обычным Page (шаблоны и внешний код проверяют
+        # тип), но соседей знает из выборки per_page + 1, а не из COUNT.
+        page.has_next = lambda: has_next
+        page.has_previous = lambda: has_previous
+        page.next_page_number = lambda: number + 1
+        page.previous_page_number = lambda: number - 1
+        # Окно ссылок считается, только если шаблон его запросит
+        page.window = lambda: self.page_window(number, has_next)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if has_next and last_key is not None:
+            page.next_cursor = self.encode_cursor(number, last_key)
+        if has_previous and first_key is not None:
+            page.previous_cursor = self.encode_cursor(number, first_key)
+        return page
+
+    def _page_after(self, number, values):
+        rows = list(
+            self.object_list.filter(self._seek(values, 'lt'))[
+                :self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return self._build_page(rows[:self.per_page], number + 1,
+                                has_next, True)
+
+    def _page_before(self, number, values):
+        reverse = self.object_list.reverse().filter(self._seek(values, 'gt'))
+        rows = list(reverse[:self.per_page + 1])
+        if len(rows) <= self.per_page:
+            # Дошли до начала ленты - отдаем честную первую страницу.
+            return self._offset_page(1)
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._build_page(rows, max(number - 1, 2), True, True)
+
+    def _offset_page(self, number):
+        if number > MAX_PAGE:
+            self._exact_count()
+            number = max(self.num_pages, 1)
+        offset = (number - 1) * self.per_page
+        rows = list(self.object_list[offset:offset + self.per_page + 1])
+        if not rows and number > 1:
+            # Номер за пределами ленты, как и Paginator.get_page,
+            # отдаем последнюю страницу. Приблизительному числу записей
+            # тут верить нельзя, поэтому пересчитываем его.
+            self._exact_count()
+            if self.num_pages < number:
+                return self._offset_page(self.num_pages)
+        has_next = len(rows) > self.per_page
+        return self._build_page(rows[:self.per_page], number,
+                                has_next, number > 1)
+
+    def get_page(self, number):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        return self._offset_page(number)
+
+    def get_cursor_page(self, params):
+        """Страница по GET-параметрам ``after``, ``before`` или ``page``."""
+        for name, seek in (('after', self._page_after),
+                           ('before', self._page_before)):
+            cursor = params.get(name)
+            if cursor:
+                decoded = self.decode_cursor(cursor)
+                if decoded is not None:
+                    return seek(*decoded)
+                return self._offset_page(1)
+        return self.get_page(params.get('page'))
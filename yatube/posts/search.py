@@ -0,0 +1,167 @@
+"""
+Полнотекстовый поиск по постам.
+
+На SQLite это внешний FTS5-индекс над posts_post.text, который триггеры
+держат в актуальном состоянии при вставке, правке и удалении постов.
+Результаты ранжируются по bm25 и листаются курсором по (rank, id).
+На других СУБД поиск откатывается к icontains.
+"""
+import base64
+import binascii
+import json
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+INSTALL_SQL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+)
+
+
+def is_available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install(using=connection):
+    """Создает индекс и триггеры, если их нет (повторный вызов безопасен)."""
+    if not is_available(using):
+        return
+    with using.cursor() as cursor:
+        for statement in INSTALL_SQL:
+            cursor.execute(statement)
+
+
+def rebuild(using=connection):
+    """Перестраивает индекс по текущему содержимому posts_post."""
+    if not is_available(using):
+        return
+    with using.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+@contextmanager
+def suspended(using=connection):
+    """
+    Снимает триггеры индекса на время массовой загрузки постов, а после
+    нее ставит их обратно и перестраивает индекс одним проходом.
+    """
+    if not is_available(using):
+        yield
+        return
+    with using.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+    try:
+        yield
+    finally:
+        install(using)
+        rebuild(using)
+
+
+def to_match(query):
+    """
+    Превращает пользовательский ввод в безопасный запрос FTS5:
+    каждое слово в кавычках (операторы FTS5 не работают), последнее
+    слово ищется по префиксу. Пустая строка, если слов нет.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _encode_cursor(rank, post_id):
+    raw = json.dumps([rank, post_id]).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        rank, post_id = json.loads(raw.decode())
+        return float(rank), int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+
+
+def _ranked_ids(match, after, limit):
+    sql = (f'SELECT rowid, rank FROM {FTS_TABLE} '
+           f'WHERE {FTS_TABLE} MATCH %s')
+    params = [match]
+    if after is not None:
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search_posts(query, cursor=None, per_page=10):
+    """
+    Страница результатов: (посты по убыванию релевантности,
+    курсор следующей страницы или None).
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    posts = Post.objects.select_related('author', 'group')
+    if not is_available():
+        # Без FTS5 - медленный, но честный поиск подстрокой.
+        post_list = posts.filter(text__icontains=query).order_by('-id')
+        if after is not None:
+            post_list = post_list.filter(id__lt=after[1])
+        found = list(post_list[:per_page + 1])
+        next_cursor = None
+        if len(found) > per_page:
+            found = found[:per_page]
+            next_cursor = _encode_cursor(0, found[-1].id)
+        return found, next_cursor
+
+    match = to_match(query)
+    if not match:
+        return [], None
+    rows = _ranked_ids(match, after, per_page + 1)
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = _encode_cursor(rows[-1][1], rows[-1][0])
+    by_id = posts.in_bulk([post_id for post_id, _ in rows])
+    return [by_id[post_id] for post_id, _ in rows
+            if post_id in by_id], next_cursor
+
+
+def filter_matching(queryset, query):
+    """Оставляет в queryset постов только совпавшие с запросом."""
+    match = to_match(query)
+    if not is_available() or not match:
+        return queryset.filter(text__icontains=query)
+    return queryset.extra(
+        where=[f'posts_post.id IN (SELECT rowid FROM {FTS_TABLE} '
+               f'WHERE {FTS_TABLE} MATCH %s)'],
+        params=[match],
+    )
@@ -0,0 +1,148 @@
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, search
+from .models import (AuthorStats, Comment, FeedEntry, Follow, Group, Post,
+                     User)
+
+
+def _bump_on_commit(*scopes):
+    # До коммита другой запрос успел бы закешировать старые данные
+    # уже под новой версией.
+    transaction.on_commit(lambda: caching.bump(*scopes))
+
+
+def _bump_follow(follow):
+    # Счетчики подписок видны в профилях обоих пользователей. При
+    # каскадном удалении пользователя его строки уже может не быть.
+    usernames = User.objects.filter(
+        id__in=(follow.user_id, follow.author_id)
+    ).values_list('username', flat=True)
+    _bump_on_commit(f'feed:{follow.user_id}',
+                    *(f'author:{username}' for username in usernames))
+
+
+def _bump_comment(comment):
+    if Comment.post.field.is_cached(comment):
+        post = comment.post
+    else:
+        post = Post.objects.select_related('author', 'group').filter(
+            id=comment.post_id).first()
+    # Карточки постов показывают число комментариев, так что комментарий
+    # меняет все страницы, где виден пост.
+    if post is not None:
+        _bump_on_commit(*caching.post_scopes(post))
+
+
+def _bump_group(group):
+    scopes = {'posts', f'group:{group.slug}'}
+    posts = Post.objects.filter(group=group).values_list(
+        'id', 'author__username')
+    for post_id, username in posts.iterator():
+        scopes.update((f'post:{post_id}', f'author:{username}'))
+    _bump_on_commit(*scopes)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    _bump_on_commit(f'author:{instance.username}')
+    if created:
+        AuthorStats.objects.create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, update_fields, **kwargs):
+    # Пост, перенесенный в другую группу, пропадает и со страницы старой
+    if instance.pk is None or (update_fields is not None
+                               and 'group' not in update_fields):
+        return
+    old = Post.objects.filter(pk=instance.pk).values_list(
+        'group_id', 'group__slug').first()
+    if old and old[0] is not None and old[0] != instance.group_id:
+        _bump_on_commit(f'group:{old[1]}')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    _bump_on_commit(*caching.post_scopes(instance))
+    if created:
+        AuthorStats.objects.bump(instance.author_id, post_count=1)
+        FeedEntry.objects.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    _bump_on_commit(*caching.post_scopes(instance))
+    AuthorStats.objects.bump(instance.author_id, post_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    _bump_follow(instance)
+    if created:
+        AuthorStats.objects.bump(instance.author_id, follower_count=1)
+        AuthorStats.objects.bump(instance.user_id, following_count=1)
+        FeedEntry.objects.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    _bump_follow(instance)
+    AuthorStats.objects.bump(instance.author_id, follower_count=-1)
+    AuthorStats.objects.bump(instance.user_id, following_count=-1)
+    FeedEntry.objects.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    _bump_comment(instance)
+    if created:
+        Post.objects.filter(id=instance.post_id).update(
+            comment_count=F('comment_count') + 1,
+            last_comment_at=instance.created)
+    else:
+        # Правка (например, в админке) тоже меняет версию раздела
+        # комментариев, иначе фрагмент отдавал бы прежний текст
+        Post.objects.filter(id=instance.post_id).update(
+            last_comment_at=timezone.now())
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    _bump_comment(instance)
+    # Удаление тоже меняет раздел комментариев, а с ним и его версию
+    Post.objects.filter(id=instance.post_id).update(
+        comment_count=F('comment_count') - 1,
+        last_comment_at=timezone.now())
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    slug = Group.objects.filter(pk=instance.pk).values_list(
+        'slug', flat=True).first()
+    if slug is not None and slug != instance.slug:
+        _bump_on_commit(f'group:{slug}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # Название группы выводится в карточках ее постов. После удаления
+    # посты уже отвязаны от группы, поэтому они собираются до него.
+    _bump_group(instance)
+
+
+@receiver(post_migrate)
+def search_index_installed(sender, using, **kwargs):
+    # Миграции на SQLite пересоздают таблицу posts_post при изменении
+    # полей и вместе с ней теряют триггеры поискового индекса.
+    connection = connections[using]
+    if (sender.name == 'posts'
+            and 'posts_post' in connection.introspection.table_names()):
+        search.install(connection)
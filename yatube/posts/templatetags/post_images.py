@@ -0,0 +1,20 @@
+from django import template
+
+from posts.images import picture_sources
+from posts.thumbnails import queue_missing_thumbnails, ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_if_ready(image, name):
+    thumbnail = ready_thumbnail(image, name)
+    if image and thumbnail is None:
+        queue_missing_thumbnails(image.name)
+    return thumbnail
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(post):
+    sources = picture_sources(post)
+    return {'sources': sources, 'fallback': sources[-1] if sources else None}
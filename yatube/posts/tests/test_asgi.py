@@ -0,0 +1,101 @@
+import asyncio
+
+from django.test import SimpleTestCase
+from yatube.asgi import WsgiToAsgi, build_environ
+
+
+def wsgi_echo(environ, start_response):
+    """Отвечает тем, что получило, в несколько кусков."""
+    start_response('201 Created', [('Content-Type', 'text/plain'),
+                                   ('X-Path', environ['PATH_INFO'])])
+    body = environ['wsgi.input'].read()
+    return [environ['QUERY_STRING'].encode(), b'', b'|', body]
+
+
+class WsgiToAsgiTest(SimpleTestCase):
+    def run_app(self, application, scope, messages):
+        incoming = list(messages)
+        sent = []
+
+        async def receive():
+            if incoming:
+                return incoming.pop(0)
+            # Как настоящий сервер: пока клиент на связи, событий нет
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+        asyncio.run(application(scope, receive, send))
+        return sent
+
+    def test_request_and_streamed_response(self):
+        """Тело запроса собирается из кусков, ответ уходит по кускам"""
+        application = WsgiToAsgi(wsgi_echo, threads=2)
+        sent = self.run_app(application, {
+            'type': 'http', 'method': 'POST', 'path': '/путь/',
+            'query_string': b'a=1', 'headers': [],
+        }, [{'type': 'http.request', 'body': b'te', 'more_body': True},
+            {'type': 'http.request', 'body': b'xt'}])
+        self.assertEqual(sent[0]['status'], 201)
+        self.assertIn((b'content-type', b'text/plain'), sent[0]['headers'])
+        self.assertEqual(
+            [message['body'] for message in sent[1:]],
+            [b'a=1', b'|', b'text', b''])
+        self.assertFalse(sent[-1].get('more_body'))
+
+    def test_disconnect_stops_response(self):
+        """Отключившийся клиент не держит поток пула"""
+        closed = []
+
+        def endless(environ, start_response):
+            start_response('200 OK', [])
+            try:
+                while True:
+                    yield b'event'
+            finally:
+                closed.append(True)
+
+        sent = []
+        incoming = [{'type': 'http.request'}]
+        gone = asyncio.Event()
+
+        async def receive():
+            if incoming:
+                return incoming.pop(0)
+            await gone.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 3:
+                gone.set()
+                # Даем циклу доставить отключение
+                await asyncio.sleep(0.01)
+
+        application = WsgiToAsgi(endless, threads=1)
+        asyncio.run(asyncio.wait_for(
+            application({'type': 'http', 'method': 'GET', 'path': '/',
+                         'query_string': b'', 'headers': []},
+                        receive, send), 5))
+        self.assertEqual(closed, [True])
+        self.assertLess(len(sent), 10)
+
+    def test_environ_headers(self):
+        environ = build_environ({
+            'type': 'http', 'method': 'GET', 'path': '/',
+            'query_string': b'', 'server': ('example.com', 8000),
+            'headers': [(b'content-type', b'text/html'),
+                        (b'accept', b'a'), (b'accept', b'b')],
+        }, b'')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/html')
+        self.assertEqual(environ['HTTP_ACCEPT'], 'a,b')
+        self.assertEqual(environ['SERVER_PORT'], '8000')
+
+    def test_lifespan(self):
+        sent = self.run_app(WsgiToAsgi(wsgi_echo, threads=1),
+                            {'type': 'lifespan'},
+                            [{'type': 'lifespan.startup'},
+                             {'type': 'lifespan.shutdown'}])
+        self.assertEqual([message['type'] for message in sent],
+                         ['lifespan.startup.complete',
+                          'lifespan.shutdown.complete'])
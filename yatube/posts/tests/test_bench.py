@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from ..models import Comment, Post
+
+
+class BenchViewsTest(TestCase):
+    def setUp(self) -> None:
+        call_command('generate_dataset', users=10, groups=2, posts=30,
+                     comments=10, follows=20, seed=1, stdout=StringIO())
+        handle, self.baseline = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, self.baseline)
+
+    def bench(self, **options):
+        call_command('bench_views', repeat=2, baseline=self.baseline,
+                     stdout=StringIO(), **options)
+
+    def test_save_and_compare_baseline(self):
+        """Замеры пишутся в эталон, пишущие страницы ничего не меняют"""
+        posts, comments = Post.objects.count(), Comment.objects.count()
+        self.bench(save=True)
+        with open(self.baseline) as baseline_file:
+            views = json.load(baseline_file)['views']
+        self.assertEqual(set(views), {
+            'index', 'group_posts', 'profile', 'post_view', 'follow_index',
+            'add_comment', 'new_post', 'api_posts', 'api_group_posts',
+            'api_author_posts', 'api_post', 'api_follow'})
+        self.assertEqual((Post.objects.count(), Comment.objects.count()),
+                         (posts, comments))
+        self.bench(slack=1000)
+
+    def test_query_regression_fails(self):
+        """Рост числа запросов против эталона - ошибка"""
+        self.bench(save=True)
+        with open(self.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        baseline['views']['index']['queries'] -= 1
+        with open(self.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file)
+        with self.assertRaisesMessage(CommandError, 'index: запросов'):
+            self.bench(slack=1000)
@@ -0,0 +1,30 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+from ..models import AuthorStats, Comment, FeedEntry, Follow, Group, Post, User
+
+
+class GenerateDatasetTest(TestCase):
+    def test_generates_consistent_dataset(self):
+        """Генератор создает заданный объем и согласованные счетчики"""
+        call_command('generate_dataset', users=20, groups=3, posts=200,
+                     comments=100, follows=60, seed=1, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertAlmostEqual(Follow.objects.count(), 60, delta=15)
+        self.assertEqual(AuthorStats.objects.verify_all(), [])
+        self.assertTrue(FeedEntry.objects.exists())
+        self.assertFalse(Comment.objects.filter(
+            created__lt=F('post__pub_date')).exists())
+        self.assertGreater(
+            Comment.objects.values('created').distinct().count(), 90)
+        # Ленты, собранные генератором, совпадают с полной пересборкой
+        fields = ('user', 'post', 'author', 'pub_date')
+        generated = set(FeedEntry.objects.values_list(*fields))
+        FeedEntry.objects.rebuild_all()
+        self.assertEqual(set(FeedEntry.objects.values_list(*fields)),
+                         generated)
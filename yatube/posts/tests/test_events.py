@@ -0,0 +1,120 @@
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from ..events import Broker, Busy, Stream, broker
+from ..models import Follow, Group, Post, User
+
+
+def read_stream(response):
+    return b''.join(response.streaming_content).decode()
+
+
+class BrokerTest(TestCase):
+    def test_publish_reaches_only_matching_channels(self):
+        broker = Broker(queue_size=1)
+        with broker.subscribe({'group:1'}) as group, \
+                broker.subscribe({'author:1', 'author:2'}) as author:
+            broker.publish({'author:2', 'group:3'}, {'id': 1})
+            broker.publish({'author:2'}, {'id': 2})
+            self.assertTrue(group.queue.empty())
+            self.assertEqual(author.queue.get_nowait(), {'id': 1})
+            # Второе событие не влезло: поток закроется, клиент догонит
+            self.assertTrue(author.overflowed)
+        self.assertFalse(broker.subscribers)
+
+    def test_limit(self):
+        broker = Broker()
+        with broker.subscribe({'group:1'}, limit=1):
+            with self.assertRaises(Busy):
+                broker.add({'group:2'}, limit=1)
+        self.assertFalse(broker.subscribers)
+
+
+@override_settings(EVENTS_STREAM_SECONDS=0)
+class EventStreamTest(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create_user(username='Author')
+        self.reader = User.objects.create_user(username='Reader')
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.other = Group.objects.create(title='Другая', slug='other')
+        self.posts = [Post.objects.create(text=f'Пост {number}',
+                                          author=self.author,
+                                          group=self.group)
+                      for number in range(3)]
+        Post.objects.create(text='Не в группе', author=self.reader,
+                            group=self.other)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_group_stream_catches_up_after_last_event_id(self):
+        response = self.client.get(
+            reverse('group_events', args=[self.group.slug]),
+            HTTP_LAST_EVENT_ID=str(self.posts[0].id))
+        self.assertEqual(response['Content-Type'],
+                         'text/event-stream; charset=utf-8')
+        body = read_stream(response)
+        self.assertEqual(body.count('event: post'), 2)
+        self.assertIn(f'id: {self.posts[2].id}\n', body)
+        self.assertIn(reverse('post_card', args=['Author', self.posts[1].id]),
+                      body)
+        # Без Last-Event-ID клиент уже видит страницу и ничего не догоняет
+        body = read_stream(self.client.get(
+            reverse('group_events', args=[self.group.slug])))
+        self.assertNotIn('event: post', body)
+
+    def test_follow_stream_reads_followed_authors(self):
+        url = reverse('follow_events')
+        self.assertEqual(Client().get(url).status_code, 302)
+        body = read_stream(self.client.get(url, {'last_event_id': 0}))
+        self.assertNotIn('event: post', body)
+        Follow.objects.create(user=self.reader, author=self.author)
+        body = read_stream(self.client.get(url, {'last_event_id': 0}))
+        self.assertEqual(body.count('event: post'), 3)
+
+    def test_group_stream_is_opt_in_for_users(self):
+        """Анонимам поток не предлагается, пользователю - только кнопкой"""
+        url = reverse('group', args=[self.group.slug])
+        events_url = reverse('group_events', args=[self.group.slug])
+        self.assertNotContains(Client().get(url), 'data-events')
+        self.assertEqual(Client().get(events_url).status_code, 302)
+        self.assertContains(self.client.get(url),
+                            f'data-events="{events_url}"')
+
+    @override_settings(EVENTS_MAX_STREAMS=1)
+    def test_streams_are_limited(self):
+        url = reverse('group_events', args=[self.group.slug])
+        held = Stream({'group:0'}, Post.objects.none())
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '0')
+        # Место освобождается, даже если поток так и не читали
+        held.close()
+        self.assertFalse(broker.subscribers)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        read_stream(response)
+        self.assertFalse(broker.subscribers)
+
+    def test_post_card(self):
+        post = self.posts[0]
+        response = self.client.get(
+            reverse('post_card', args=['Author', post.id]))
+        self.assertContains(response, f'name="post_{post.id}"')
+        self.assertEqual(self.client.get(
+            reverse('post_card', args=['Reader', post.id])).status_code, 404)
+
+
+class PublishTest(TransactionTestCase):
+    def test_new_post_publishes_after_commit(self):
+        user = User.objects.create_user(username='Author')
+        group = Group.objects.create(title='Группа', slug='group')
+        client = Client()
+        client.force_login(user)
+        with broker.subscribe({f'group:{group.id}'}) as subscriber:
+            client.post(reverse('new_post'),
+                        {'text': 'Новый пост', 'group': group.id})
+            event = subscriber.queue.get_nowait()
+        post = Post.objects.get()
+        self.assertEqual(
+            (event['id'], event['author'], event['group']),
+            (post.id, 'Author', 'group'))
@@ -0,0 +1,70 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from .. import export
+from ..models import Comment, Follow, Post, User
+
+
+class ExportTest(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create_user(username='Author')
+        reader = User.objects.create_user(username='Reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.posts = [Post.objects.create(text=f'Пост {number}',
+                                          author=self.author)
+                      for number in range(3)]
+        Comment.objects.create(post=self.posts[0], author=reader,
+                               text='Комментарий')
+        self.staff_client = Client()
+        self.staff_client.force_login(User.objects.create_user(
+            username='Staff', is_staff=True))
+
+    def test_command_writes_jsonl_and_gzip_csv(self):
+        """Команда пишет JSONL и сжатый CSV"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'posts.jsonl')
+            call_command('export_data', 'posts', output=path,
+                         stdout=StringIO())
+            with open(path, encoding='utf-8') as dump:
+                rows = [json.loads(line) for line in dump]
+            path = os.path.join(directory, 'follows.csv.gz')
+            call_command('export_data', 'follows', format='csv',
+                         output=path, stdout=StringIO())
+            with gzip.open(path, 'rt', encoding='utf-8') as dump:
+                follows = list(csv.DictReader(dump))
+        self.assertEqual([row['id'] for row in rows],
+                         [post.id for post in self.posts])
+        self.assertEqual(rows[0]['author'], 'Author')
+        self.assertEqual(rows[0]['comment_count'], 1)
+        self.assertEqual(follows[0]['user'], 'Reader')
+
+    def test_output_is_streamed_in_batches(self):
+        """Выгрузка отдается несколькими кусками, а не одним целым"""
+        Post.objects.bulk_create(
+            Post(text='x' * 1000, author=self.author) for _ in range(200))
+        chunks = list(export.stream('posts', chunk_size=50))
+        self.assertGreater(len(chunks), 1)
+        lines = b''.join(chunks).decode().splitlines()
+        self.assertEqual(len(lines), 203)
+
+    def test_staff_only_streaming_endpoint(self):
+        """Выгрузка по HTTP доступна только сотрудникам"""
+        url = reverse('export', args=['comments'])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.staff_client.get(url, {'format': 'csv',
+                                               'gzip': '1'})
+        self.assertTrue(response.streaming)
+        self.assertIn('comments.csv.gz', response['Content-Disposition'])
+        content = gzip.decompress(b''.join(response.streaming_content))
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual(rows[0]['text'], 'Комментарий')
+        self.assertEqual(self.staff_client.get(
+            reverse('export', args=['users'])).status_code, 404)
@@ -0,0 +1,70 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from ..models import FeedEntry, Follow, Post, User
+
+
+class FollowFeedTest(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create_user(username='Author')
+        self.reader = User.objects.create_user(username='Reader')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.old_post = Post.objects.create(text='Старый пост',
+                                            author=self.author)
+
+    def feed_posts(self):
+        response = self.reader_client.get(reverse('follow_index'))
+        return list(response.context['page'])
+
+    def test_follow_backfills_feed(self):
+        """После подписки в ленте появляются прежние посты автора"""
+        self.reader_client.get(reverse(
+            'profile_follow', kwargs={'username': self.author.username}))
+        self.assertEqual(self.feed_posts(), [self.old_post])
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост попадает в ленты подписчиков"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self.feed_posts(), [new_post, self.old_post])
+
+    def test_unfollow_prunes_feed(self):
+        """После отписки посты автора пропадают из ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader_client.get(reverse(
+            'profile_unfollow', kwargs={'username': self.author.username}))
+        self.assertEqual(self.feed_posts(), [])
+        self.assertFalse(FeedEntry.objects.exists())
+
+    @override_settings(FEED_MAX_LENGTH=3)
+    def test_feed_length_is_capped(self):
+        """Лента подписок обрезается до FEED_MAX_LENGTH постов"""
+        posts = [Post.objects.create(text=f'Пост {number}',
+                                     author=self.author)
+                 for number in range(4)]
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed_posts(), posts[:0:-1])
+
+    @override_settings(FEED_MAX_LENGTH=3)
+    def test_fan_out_trims_feed(self):
+        """Новые посты не растят ленту сверх FEED_MAX_LENGTH"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {number}',
+                                     author=self.author)
+                 for number in range(5)]
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(),
+                         3)
+        self.assertEqual(self.feed_posts(), posts[:1:-1])
+
+    @override_settings(FEED_MAX_LENGTH=3)
+    def test_rebuild_matches_incremental_feed(self):
+        """Пересборка лент дает то же, что и поддержка на лету"""
+        for number in range(4):
+            Post.objects.create(text=f'Пост {number}', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.author, author=self.reader)
+        Post.objects.create(text='Пост читателя', author=self.reader)
+        fields = ('user', 'post', 'author', 'pub_date')
+        before = set(FeedEntry.objects.values_list(*fields))
+        FeedEntry.objects.rebuild_all()
+        self.assertEqual(set(FeedEntry.objects.values_list(*fields)), before)
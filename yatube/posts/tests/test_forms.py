@@ -8,7 +8,7 @@ import shutil
 import tempfile
 
 
-@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), THUMBNAIL_WORKERS=0)
 class FormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from ..models import AuthorStats, Comment, FeedEntry, Follow, Group, Post, User
+from ..search import search_posts
+
+
+class ImportPostsTest(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create_user(username='Author')
+        self.reader = User.objects.create_user(username='Reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Group.objects.create(title='Коты', slug='cats', description='')
+
+    def write(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as source:
+            source.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def write_jsonl(self, *records):
+        return self.write('.jsonl', ''.join(
+            json.dumps(record, ensure_ascii=False) + '\n'
+            for record in records))
+
+    def run_import(self, path, **options):
+        stderr = StringIO()
+        call_command('import_posts', path, stdout=StringIO(),
+                     stderr=stderr, **options)
+        return stderr.getvalue()
+
+    def test_jsonl_import_rebuilds_derived_data(self):
+        """Посты и комментарии загружаются, производные данные целы"""
+        path = self.write_jsonl(
+            {'id': 500, 'author': 'Author', 'group': 'cats',
+             'text': 'Старый пост про котиков',
+             'pub_date': '2015-03-01T10:00:00'},
+            {'type': 'comment', 'post': 500, 'author': 'Reader',
+             'text': 'Комментарий'},
+            {'author': 'Author', 'text': 'Второй пост'})
+        self.assertEqual(self.run_import(path), '')
+        post = Post.objects.get(id=500)
+        self.assertEqual(post.group.slug, 'cats')
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(post.last_comment_at,
+                         post.comments.get().created)
+        self.assertEqual(Post.objects.filter(author=self.author).count(), 2)
+        self.assertEqual(AuthorStats.objects.verify_all(), [])
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(),
+                         2)
+        self.assertEqual(search_posts('котиков')[0], [post])
+
+    def test_csv_import_and_missing_authors(self):
+        """CSV со ссылками на неизвестных авторов и группы"""
+        path = self.write('.csv', 'type,id,author,group,text,post\n'
+                                  'post,10,Legacy,dogs,Пост из CSV,\n'
+                                  'comment,,Legacy,,Ответ,10\n')
+        self.assertIn('нет автора Legacy', self.run_import(path))
+        self.assertFalse(Post.objects.exists())
+        self.run_import(path, create_missing=True)
+        post = Post.objects.get(id=10)
+        self.assertEqual((post.author.username, post.group.slug),
+                         ('Legacy', 'dogs'))
+        self.assertEqual(Comment.objects.get().post, post)
+
+    def test_bad_records_are_skipped_or_fatal(self):
+        """Ошибочные записи пропускаются, а в строгом режиме - ошибка"""
+        path = self.write('.jsonl', '{"author": "Author", "text": "Ок"}\n'
+                                    '{oops\n'
+                                    '{"author": "Author", "text": ""}\n'
+                                    '{"type": "comment", "post": 999, '
+                                    '"author": "Author", "text": "Нет"}\n')
+        errors = self.run_import(path)
+        self.assertEqual(len(errors.splitlines()), 3)
+        self.assertEqual(Post.objects.count(), 1)
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            self.run_import(path, strict=True)
+
+    def test_failed_chunk_keeps_derived_data_of_committed_ones(self):
+        """После ошибки в пачке счетчики и ленты сходятся с постами"""
+        path = self.write_jsonl(
+            {'id': 500, 'author': 'Author', 'text': 'Первый пост'},
+            {'id': 500, 'author': 'Author', 'text': 'Тот же id'})
+        with self.assertRaisesMessage(CommandError, 'Строки 2-2'):
+            self.run_import(path, chunk=1)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(AuthorStats.objects.verify_all(), [])
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(),
+                         1)
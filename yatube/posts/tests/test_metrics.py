@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from ..metrics import exposition, Registry
+from ..models import Post, User
+
+
+class MetricsTest(TestCase):
+    def setUp(self) -> None:
+        author = User.objects.create_user(username='Author')
+        Post.objects.create(text='Текст', author=author)
+        self.staff = User.objects.create_user(username='Staff',
+                                              is_staff=True)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def metrics(self):
+        response = self.staff_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def sample(self, text, prefix):
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line.rsplit(' ', 1)[1])
+        return None
+
+    def test_metrics_are_staff_only(self):
+        """Метрики видны только сотрудникам"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code,
+                         403)
+        reader = Client()
+        reader.force_login(User.objects.create_user(username='Reader'))
+        self.assertEqual(reader.get(reverse('metrics')).status_code, 403)
+
+    def test_view_is_measured(self):
+        """Запрос к странице учитывается по имени маршрута"""
+        before = self.metrics()
+        requests = ('yatube_requests_total{method="GET",status="200",'
+                    'view="index"}')
+        queries = 'yatube_db_queries_total{view="index"}'
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        after = self.metrics()
+        self.assertEqual(self.sample(after, requests)
+                         - (self.sample(before, requests) or 0), 2)
+        self.assertGreater(self.sample(after, queries), 0)
+        self.assertGreater(self.sample(
+            after, 'yatube_cache_hits_total{view="index"}'), 0)
+        self.assertGreater(self.sample(
+            after, 'yatube_template_render_seconds_total{view="index"}'), 0)
+        self.assertIn('yatube_request_duration_seconds_bucket{le="0.005",'
+                      'view="index"}', after)
+
+    def test_processes_are_summed(self):
+        """Значения всех процессов из METRICS_DIR складываются"""
+        with tempfile.TemporaryDirectory() as directory:
+            labels = [['view', 'index']]
+            with open(os.path.join(directory, '1-other.json'), 'w') as other:
+                json.dump([['yatube_db_queries_total', labels, 5]], other)
+            registry = Registry()
+            registry.inc('yatube_db_queries_total', {'view': 'index'}, 3)
+            with override_settings(METRICS_DIR=directory):
+                text = exposition(registry.collect())
+        self.assertIn('# TYPE yatube_db_queries_total counter', text)
+        self.assertIn('yatube_db_queries_total{view="index"} 8', text)
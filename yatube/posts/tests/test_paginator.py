@@ -1,5 +1,9 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase
-from ..models import Post, Group, User
+from django.test.utils import CaptureQueriesContext
+from ..models import Comment, Post, Group, User
+from ..paginator import KeysetPaginator
 from django.urls import reverse
 
 
@@ -36,3 +40,148 @@ class PaginatorTest(TestCase):
                 response = self.authorized_client.get(
                     reverse(page, kwargs=kwargs), page_param)
                 self.assertEqual(len(response.context['page']), count)
+
+
+class KeysetPaginatorTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.guest_client = Client()
+        self.user = User.objects.create_user(
+            username='TestUser'
+        )
+        for _ in range(25):
+            Post.objects.create(
+                text=f'{_}Текст для тестового поста',
+                author=self.user,)
+
+    def test_cursor_walk_covers_all_posts(self):
+        """Переход по курсорам отдает все записи ровно один раз"""
+        seen = []
+        params = {}
+        while True:
+            page = self.guest_client.get(
+                reverse('index'), params).context['page']
+            seen.extend(post.id for post in page)
+            if not page.has_next():
+                break
+            params = {'after': page.next_cursor}
+        self.assertEqual(page.number, 3)
+        self.assertEqual(
+            seen,
+            list(Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True)))
+
+    def test_cursor_back_returns_previous_page(self):
+        """Курсор before возвращает предыдущую страницу"""
+        first = self.guest_client.get(reverse('index')).context['page']
+        second = self.guest_client.get(
+            reverse('index'), {'after': first.next_cursor}).context['page']
+        third = self.guest_client.get(
+            reverse('index'), {'after': second.next_cursor}).context['page']
+        back = self.guest_client.get(
+            reverse('index'),
+            {'before': third.previous_cursor}).context['page']
+        self.assertEqual(back.number, 2)
+        self.assertEqual(list(back), list(second))
+        back = self.guest_client.get(
+            reverse('index'),
+            {'before': back.previous_cursor}).context['page']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_gives_first_page(self):
+        """Испорченный курсор не ломает страницу"""
+        response = self.guest_client.get(reverse('index'),
+                                         {'after': 'испорчен'})
+        self.assertEqual(response.context['page'].number, 1)
+        self.assertEqual(len(response.context['page']), 10)
+
+    def test_huge_numbers_give_last_page(self):
+        """Огромный номер страницы или курсора не роняет запрос"""
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        response = self.guest_client.get(
+            reverse('index'), {'page': '9' * 20})
+        self.assertEqual(response.context['page'].number, 3)
+        self.assertEqual(len(response.context['page']), 5)
+        last = Post.objects.order_by('pub_date', 'id').first()
+        for number in (10 ** 20, 1e400):
+            with self.subTest(number=number):
+                cursor = paginator.encode_cursor(
+                    number, (last.pub_date, last.id))
+                response = self.guest_client.get(reverse('index'),
+                                                 {'before': cursor})
+                self.assertEqual(response.status_code, 200)
+        response = self.guest_client.get(
+            reverse('api:posts'), {'page': '9' * 20})
+        self.assertEqual(response.status_code, 200)
+
+    def test_pages_do_not_count_rows(self):
+        """Страницы ленты обходятся без COUNT(*) и не рисуют все номера"""
+        Post.objects.bulk_create(
+            Post(text='Пост', author=self.user) for _ in range(100))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(reverse('index'), {'page': 6})
+        counts = [query for query in queries if 'COUNT' in query['sql']]
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(response.context['page'].window(),
+                         [1, None, 4, 5, 6, 7, 8, None, 13])
+        self.assertNotContains(response, '?page=9"')
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(reverse('index'), {'page': 7})
+        self.assertFalse([query for query in queries
+                          if 'COUNT' in query['sql']])
+
+    def test_window_edges(self):
+        """Окно у краев ленты и приблизительный счетчик"""
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        self.assertEqual(paginator.page_window(1, True), [1, 2, 3])
+        self.assertEqual(paginator.page_window(3, False), [1, 2, 3])
+        Post.objects.bulk_create(
+            Post(text='Пост', author=self.user) for _ in range(50))
+        # В кеше устаревшее число записей, но следующая страница есть
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        self.assertEqual(paginator.page_window(3, True), [1, 2, 3, 4])
+        # Номер за пределами ленты пересчитывает записи точно
+        page = paginator.get_page(100)
+        self.assertEqual((page.number, len(page)), (8, 5))
+        self.assertEqual(paginator.page_window(3, True),
+                         [1, 2, 3, 4, 5, None, 8])
+
+
+class CommentPagesTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(username='TestUser')
+        self.post = Post.objects.create(text='Пост', author=self.user)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Комментарий {_}')
+            for _ in range(45))
+        self.kwargs = {'username': self.user.username,
+                       'post_id': self.post.id}
+
+    def test_comments_load_by_pages(self):
+        """Пост показывает первую страницу, остальное - по кнопке"""
+        response = self.client.get(reverse('post', kwargs=self.kwargs))
+        page = response.context['comments']
+        self.assertEqual(len(page), 20)
+        self.assertContains(response, 'js-more-comments')
+        seen = [comment.id for comment in page]
+        while page.has_next():
+            response = self.client.get(
+                reverse('post_comments', kwargs=self.kwargs),
+                {'after': page.next_cursor})
+            self.assertTemplateUsed(response, 'includes/comment_page.html')
+            page = response.context['comments']
+            seen.extend(comment.id for comment in page)
+        self.assertNotContains(response, 'js-more-comments')
+        self.assertEqual(seen, list(
+            self.post.comments.order_by('-created', '-id').values_list(
+                'id', flat=True)))
+
+    def test_post_page_does_not_load_all_comments(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('post', kwargs=self.kwargs))
+        comments = [query['sql'] for query in queries
+                    if 'FROM "posts_comment"' in query['sql']]
+        self.assertEqual(len(comments), 1)
+        self.assertIn('LIMIT 21', comments[0])
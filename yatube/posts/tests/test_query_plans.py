@@ -0,0 +1,88 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from ..models import Comment, Follow, Group, Post, User
+from ..search import FTS_TABLE
+
+
+class QueryPlanTest(TestCase):
+    """
+    Каждый SELECT в представлениях должен идти по индексу: полный
+    просмотр таблицы или временное B-дерево для сортировки означают,
+    что запрос перестанет масштабироваться вместе с данными.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username='Author')
+        self.reader = User.objects.create_user(username='Reader')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=self.reader, author=self.author)
+        for number in range(12):
+            self.post = Post.objects.create(
+                text=f'Пост номер {number}',
+                author=self.author,
+                group=self.group,
+            )
+            Comment.objects.create(post=self.post, author=self.reader,
+                                   text='Комментарий')
+
+    def plans(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                yield sql, [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, url, params=None):
+        for sql, plan in self.plans(url, params):
+            # bm25 считается по найденным строкам, их сортировка
+            # в поиске неизбежна и ограничена числом совпадений
+            ranked = FTS_TABLE in sql
+            for step in plan:
+                with self.subTest(url=url, params=params, sql=sql):
+                    if not ranked:
+                        self.assertNotIn('TEMP B-TREE', step)
+                    if step.startswith('SCAN'):
+                        self.assertRegex(
+                            step, r'USING (COVERING )?INDEX|VIRTUAL TABLE')
+
+    def next_cursor(self, url):
+        return self.reader_client.get(url).context['page'].next_cursor
+
+    def test_feed_queries_use_indexes(self):
+        feeds = (
+            reverse('index'),
+            reverse('group', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.author.username}),
+            reverse('follow_index'),
+        )
+        for url in feeds:
+            self.assert_indexed(url)
+            self.assert_indexed(url, {'after': self.next_cursor(url)})
+
+    def test_post_page_queries_use_indexes(self):
+        kwargs = {
+            'username': self.author.username,
+            'post_id': self.post.id,
+        }
+        for number in range(25):
+            Comment.objects.create(post=self.post, author=self.reader,
+                                   text=f'Комментарий {number}')
+        self.assert_indexed(reverse('post', kwargs=kwargs))
+        cursor = self.reader_client.get(
+            reverse('post', kwargs=kwargs)).context['comments'].next_cursor
+        self.assert_indexed(reverse('post_comments', kwargs=kwargs),
+                            {'after': cursor})
+
+    def test_search_queries_use_indexes(self):
+        self.assert_indexed(reverse('search'), {'q': 'номер'})
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.contrib.sessions.models import Session
+from django.urls import reverse
+from yatube.routers import PIN_COOKIE, PrimaryPinMiddleware, ReplicaRouter
+from ..models import Post, User
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTest(SimpleTestCase):
+    """Маршрутизация решает по псевдонимам, к базам не обращается"""
+
+    def setUp(self) -> None:
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def run_request(self, request, *steps):
+        """Проводит запрос через middleware, steps - 'read' и 'write'."""
+        used = []
+
+        def view(request):
+            for step in steps:
+                if step == 'read':
+                    used.append(self.router.db_for_read(Post))
+                else:
+                    used.append(self.router.db_for_write(Post))
+            return HttpResponse()
+        return used, PrimaryPinMiddleware(view)(request)
+
+    def test_reads_go_to_replicas_outside_writes(self):
+        used, response = self.run_request(self.factory.get('/'),
+                                          'read', 'read')
+        self.assertTrue(set(used) <= {'replica1', 'replica2'})
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        # Вне запроса (команды, фоновые потоки) - только основная база
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_write_pins_reader_to_primary(self):
+        used, response = self.run_request(self.factory.get('/'),
+                                          'read', 'write', 'read')
+        self.assertEqual(used[1:], ['default', 'default'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        used, response = self.run_request(request, 'read')
+        self.assertEqual(used, ['default'])
+
+    def test_unsafe_methods_and_sessions_use_primary(self):
+        used, response = self.run_request(self.factory.post('/'), 'read')
+        self.assertEqual(used, ['default'])
+
+        def view(request):
+            return HttpResponse(self.router.db_for_read(Session))
+        response = PrimaryPinMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(response.content, b'default')
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+
+@override_settings(DATABASE_REPLICAS=['lagging'])
+class LaggingReplicaTest(TransactionTestCase):
+    """Отставшая реплика не попадает в кеш под новой версией"""
+
+    def setUp(self) -> None:
+        cache.clear()
+        handle, self.replica = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        # Псевдоним заводится после настройки класса, поэтому тест
+        # может к нему обращаться, а очищать его Django не станет
+        connections.databases['lagging'] = dict(
+            connections.databases['default'], NAME=self.replica)
+        self.addCleanup(self.remove_replica)
+        self.author = User.objects.create_user(username='Author')
+        Post.objects.create(text='Первый пост', author=self.author)
+        self.sync()
+
+    def remove_replica(self):
+        connections['lagging'].close()
+        del connections.databases['lagging']
+        delattr(connections._connections, 'lagging')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.replica + suffix):
+                os.remove(self.replica + suffix)
+
+    def sync(self):
+        """Реплика догоняет основную базу."""
+        connections['lagging'].close()
+        primary = connections['default']
+        primary.ensure_connection()
+        replica = sqlite3.connect(self.replica)
+        primary.connection.backup(replica)
+        replica.close()
+
+    def test_fresh_changes_are_rendered_from_primary(self):
+        url = reverse('index')
+        self.assertContains(self.client.get(url), 'Первый пост')
+        Post.objects.create(text='Второй пост', author=self.author)
+        # Реплика еще не видит второго поста, но страница под новой
+        # версией читается из основной базы
+        self.assertContains(self.client.get(url), 'Второй пост')
+        cache.clear()
+        self.assertContains(self.client.get(url), 'Второй пост')
+        # Когда версии старше отставания, чтение снова идет с реплики;
+        # новый адрес - та же версия, но страницы в кеше еще нет
+        later = time.time() + settings.REPLICA_PIN_SECONDS + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertNotContains(self.client.get(url, {'v': 1}),
+                                   'Второй пост')
+            self.sync()
+            self.assertContains(self.client.get(url, {'v': 2}),
+                                'Второй пост')
@@ -0,0 +1,53 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+from ..models import Post, User
+from ..search import to_match
+
+
+class SearchTest(TestCase):
+    def setUp(self) -> None:
+        self.guest_client = Client()
+        self.user = User.objects.create_user(username='TestUser')
+        self.often = Post.objects.create(
+            text='Котики, котики и еще раз котики', author=self.user)
+        self.once = Post.objects.create(
+            text='Про собак и немного про котики', author=self.user)
+        Post.objects.create(text='Совсем другой текст', author=self.user)
+
+    def search(self, query, **params):
+        response = self.guest_client.get(reverse('search'),
+                                         {'q': query, **params})
+        return response.context['posts'], response.context['next_cursor']
+
+    def test_results_are_ranked(self):
+        """Пост, где слово встречается чаще, выше в выдаче"""
+        posts, next_cursor = self.search('котики')
+        self.assertEqual(posts, [self.often, self.once])
+        self.assertIsNone(next_cursor)
+
+    def test_index_follows_save_and_delete(self):
+        """Индекс обновляется при правке и удалении поста"""
+        self.once.text = 'Теперь только про собак'
+        self.once.save()
+        self.assertEqual(self.search('котики')[0], [self.often])
+        self.assertEqual(self.search('собак')[0], [self.once])
+        self.often.delete()
+        self.assertEqual(self.search('котики')[0], [])
+
+    def test_cursor_pagination(self):
+        """Курсор ведет на следующую страницу без повторов"""
+        for number in range(12):
+            Post.objects.create(text=f'Поиск номер {number}',
+                                author=self.user)
+        first, next_cursor = self.search('поиск')
+        second, last_cursor = self.search('поиск', after=next_cursor)
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(last_cursor)
+        self.assertFalse(set(first) & set(second))
+
+    def test_user_input_is_escaped(self):
+        """Операторы FTS5 в запросе не ломают поиск"""
+        self.assertEqual(to_match('котики" OR *'), '"котики" "OR"*')
+        self.assertEqual(self.search('"(( AND')[0], [])
+        self.assertEqual(self.search('???')[0], [])
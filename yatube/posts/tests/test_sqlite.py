@@ -0,0 +1,40 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS
+from django.db.utils import ConnectionHandler
+from django.test import TestCase
+
+
+class SqliteProfileTest(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_pragmas_applied_on_connect(self):
+        """Подключение включает WAL и PRAGMA, OPTIONS их переопределяют"""
+        handler = ConnectionHandler({DEFAULT_DB_ALIAS: {
+            'ENGINE': 'yatube.backends.sqlite3',
+            'NAME': os.path.join(self.directory.name, 'db.sqlite3'),
+            'OPTIONS': {'pragmas': {'busy_timeout': 1000}},
+        }})
+        connection = handler[DEFAULT_DB_ALIAS]
+        self.addCleanup(connection.close)
+        with connection.cursor() as cursor:
+            values = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {name}')
+                values[name] = cursor.fetchone()[0]
+        self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1,
+                                  'busy_timeout': 1000})
+
+    def test_bench_sqlite_reports_both_profiles(self):
+        out = StringIO()
+        call_command('bench_sqlite', readers=2, writers=1, seconds=0.2,
+                     rows=100, stdout=out)
+        output = out.getvalue()
+        self.assertIn('default', output)
+        self.assertIn('production', output)
+        self.assertIn('reads: x', output)
@@ -0,0 +1,62 @@
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.test import Client, TestCase
+from django.urls import reverse
+from ..models import AuthorStats, Follow, Post, User
+
+
+class AuthorStatsTest(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create_user(username='Author')
+        self.reader = User.objects.create_user(username='Reader')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def assert_counters(self, user, post_count, follower_count,
+                        following_count):
+        stats = AuthorStats.objects.get(user=user)
+        self.assertEqual(
+            (stats.post_count, stats.follower_count, stats.following_count),
+            (post_count, follower_count, following_count))
+
+    def test_post_counter(self):
+        """Счетчик записей следует за созданием и удалением постов"""
+        post = Post.objects.create(text='Первый', author=self.author)
+        Post.objects.create(text='Второй', author=self.author)
+        self.assert_counters(self.author, 2, 0, 0)
+        post.delete()
+        self.assert_counters(self.author, 1, 0, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счетчики обоих пользователей"""
+        self.reader_client.get(reverse(
+            'profile_follow', kwargs={'username': self.author.username}))
+        self.assert_counters(self.author, 0, 1, 0)
+        self.assert_counters(self.reader, 0, 0, 1)
+        self.reader_client.get(reverse(
+            'profile_unfollow', kwargs={'username': self.author.username}))
+        self.assert_counters(self.author, 0, 0, 0)
+        self.assert_counters(self.reader, 0, 0, 0)
+
+    def test_missing_stats_are_recounted(self):
+        """Профиль без записи счетчиков пересчитывает их сам"""
+        Post.objects.create(text='Текст', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.all().delete()
+        response = self.reader_client.get(reverse(
+            'profile', kwargs={'username': self.author.username}))
+        self.assertEqual(response.context['count_post'], 1)
+        self.assertEqual(response.context['follow_count'], 1)
+        self.assertEqual(response.context['self_follow_count'], 0)
+        self.assert_counters(self.author, 1, 1, 0)
+
+    def test_rebuild_command_verifies_counters(self):
+        """Команда находит и чинит разошедшиеся счетчики"""
+        Post.objects.create(text='Текст', author=self.author)
+        AuthorStats.objects.filter(user=self.author).update(post_count=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_author_stats', '--verify', stdout=StringIO())
+        call_command('rebuild_author_stats', stdout=StringIO())
+        call_command('rebuild_author_stats', '--verify', stdout=StringIO())
+        self.assert_counters(self.author, 1, 0, 0)
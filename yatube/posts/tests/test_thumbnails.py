@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from ..models import Post, User
+from ..images import generate_variants, supported_formats
+from ..thumbnails import (generate_thumbnails, queue_missing_thumbnails,
+                          ready_thumbnail)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), THUMBNAIL_WORKERS=0)
+class ThumbnailTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(username='TestUser')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile(name='small.gif', content=SMALL_GIF,
+                                     content_type='image/gif'),
+        )
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT)
+        super().tearDown()
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, лента показывает заглушку и ставит нарезку"""
+        response = self.authorized_client.get(reverse('index'))
+        self.assertNotContains(response, '<img class="card-img"')
+        # Пост сохранен в обход views: нарезку поставил промах в шаблоне
+        thumbnail = ready_thumbnail(self.post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, thumbnail.url)
+
+    def test_missing_thumbnail_is_queued_once(self):
+        """Повторные промахи не ставят нарезку заново"""
+        with mock.patch('posts.thumbnails.submit') as submit:
+            for _ in range(3):
+                queue_missing_thumbnails(self.post.image.name)
+        submit.assert_called_once_with(generate_thumbnails,
+                                       self.post.image.name)
+
+    def test_backfill_command(self):
+        """Команда догоняет миниатюры и варианты старых картинок"""
+        call_command('backfill_images', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.variants)
+        self.assertIsNotNone(ready_thumbnail(self.post.image, 'card'))
+        stdout = StringIO()
+        call_command('backfill_images', stdout=stdout)
+        self.assertIn('миниатюры: 0, варианты: 0', stdout.getvalue())
+
+    def test_generated_thumbnail_is_shown(self):
+        """После фоновой нарезки в ленте появляется миниатюра"""
+        generate_thumbnails(self.post.image.name)
+        thumbnail = ready_thumbnail(self.post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, thumbnail.url)
+
+    def test_responsive_variants(self):
+        """Варианты картинки выводятся через picture/srcset"""
+        generate_variants(self.post.id)
+        self.post.refresh_from_db()
+        formats = {variant['format'] for variant in self.post.variants}
+        self.assertEqual(formats, set(supported_formats()))
+        self.assertIn('WEBP', formats)
+        self.assertEqual(
+            len(self.post.variants),
+            len(formats) * len(settings.POST_IMAGE_WIDTHS))
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '960w')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), THUMBNAIL_WORKERS=0)
+class ImageEditTest(TransactionTestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='TestUser')
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile(name='first.gif', content=SMALL_GIF,
+                                     content_type='image/gif'),
+        )
+        generate_variants(self.post.id)
+        self.post.refresh_from_db()
+        self.url = reverse('post_edit', args=['TestUser', self.post.id])
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT)
+        super().tearDown()
+
+    def variant_files(self):
+        directory = os.path.join(settings.MEDIA_ROOT, 'posts', 'variants',
+                                 str(self.post.id))
+        return sorted(os.listdir(directory))
+
+    def test_replaced_and_cleared_image_leave_no_variants(self):
+        """Варианты прежней картинки удаляются с диска"""
+        old_files = self.variant_files()
+        self.assertTrue(all(name.startswith('first-') for name in old_files))
+        self.client.post(self.url, {
+            'text': 'Новая картинка',
+            'image': SimpleUploadedFile(name='second.gif', content=SMALL_GIF,
+                                        content_type='image/gif'),
+        })
+        self.post.refresh_from_db()
+        self.assertEqual(
+            self.variant_files(),
+            sorted(os.path.basename(variant['name'])
+                   for variant in self.post.variants))
+        self.assertEqual(
+            [name.replace('second', 'first') for name in self.variant_files()],
+            old_files)
+        self.client.post(self.url, {'text': 'Без картинки',
+                                    'image-clear': 'on'})
+        self.assertEqual(self.variant_files(), [])
@@ -1,15 +1,23 @@
 import shutil
 import tempfile
+import time
+from unittest import mock
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from ..caching import bump, get_versions
 from ..models import Post, Group, User, Comment, Follow
 from django.urls import reverse
 from django import forms
 
 
-@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), THUMBNAIL_WORKERS=0)
 class ViewsTests(TestCase):
     def setUp(self) -> None:
         """
@@ -249,3 +257,330 @@ class ViewsTests(TestCase):
         self.assertEqual(len(response.context['page']), 1)
         response = self.follow_user.get(reverse('follow_index'))
         self.assertEqual(len(response.context['page']), 0)
+
+
+class FeedQueriesTest(TestCase):
+    def setUp(self) -> None:
+        self.guest_client = Client()
+        self.user = User.objects.create_user(
+            username='TestUser'
+        )
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug'
+        )
+        self.pages = (
+            ('index', {}),
+            ('group', {'slug': self.group.slug}),
+            ('profile', {'username': self.user.username}),
+        )
+
+    def create_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(
+                text=f'Пост {number}',
+                author=self.user,
+                group=self.group,
+            )
+            Comment.objects.create(post=post, author=self.user,
+                                   text='Комментарий')
+
+    def count_queries(self, page, kwargs):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(reverse(page, kwargs=kwargs))
+        return len(queries)
+
+    def test_comment_count_is_denormalized(self):
+        """Счетчик комментариев поста следует за комментариями"""
+        self.create_posts(1)
+        post = Post.objects.get()
+        self.assertEqual(post.comment_count, 1)
+        Comment.objects.get().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+    def test_comment_and_counter_commit_together(self):
+        """Комментарий не сохраняется, если счетчик не обновился"""
+        self.create_posts(1)
+        post = Post.objects.get()
+        with mock.patch.object(QuerySet, 'update',
+                               side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.authorized_client.post(
+                    reverse('add_comment', args=[self.user.username,
+                                                 post.id]),
+                    {'text': 'Второй комментарий'})
+        self.assertEqual(post.comments.count(), 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не зависит от числа постов на странице"""
+        self.create_posts(1)
+        single = {page: self.count_queries(page, kwargs)
+                  for page, kwargs in self.pages}
+        self.create_posts(9)
+        for page, kwargs in self.pages:
+            with self.subTest(page=page):
+                self.assertEqual(self.count_queries(page, kwargs),
+                                 single[page])
+        Follow.objects.create(
+            user=User.objects.create_user(username='Reader'),
+            author=self.user)
+        reader = Client()
+        reader.force_login(User.objects.get(username='Reader'))
+        with CaptureQueriesContext(connection) as queries:
+            response = reader.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page']), 10)
+        self.assertLessEqual(len(queries), single['index'] + 3)
+
+    def test_author_lookups_share_queries(self):
+        """Автор, его счетчики и подписка читаются одним запросом"""
+        self.create_posts(1)
+        post = Post.objects.get()
+        reader = User.objects.create_user(username='Reader')
+        Follow.objects.create(user=reader, author=self.user)
+        client = Client()
+        client.force_login(reader)
+        anonymous = self.count_queries('profile',
+                                       {'username': self.user.username})
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse(
+                'profile', kwargs={'username': self.user.username}))
+        self.assertTrue(response.context['following'])
+        # Сверх анонимного запроса - только сессия и пользователь
+        self.assertEqual(len(queries), anonymous + 2)
+        self.assertEqual(self.count_queries('post', {
+            'username': self.user.username, 'post_id': post.id}), 2)
+
+
+class FeedCacheTest(TransactionTestCase):
+    """Сброс кеша по версиям срабатывает после коммита"""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.guest_client = Client()
+        self.user = User.objects.create_user(
+            username='TestUser'
+        )
+        self.post = Post.objects.create(
+            text='Первый пост',
+            author=self.user,
+        )
+
+    def test_index_is_cached_until_post_changes(self):
+        self.guest_client.get(reverse('index'))
+        # update() не шлет сигналов: версия та же, страница из кеша
+        Post.objects.filter(id=self.post.id).update(text='Тихая правка')
+        response = self.guest_client.get(reverse('index'))
+        self.assertNotContains(response, 'Тихая правка')
+        self.post.text = 'Правка через save'
+        self.post.save()
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Правка через save')
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Новый пост')
+
+    def test_anonymous_profile_page_is_cached(self):
+        """Профиль для гостя берется из кеша до подписки на автора"""
+        url = reverse('profile', kwargs={'username': self.user.username})
+        self.assertIsNotNone(self.guest_client.get(url).context)
+        response = self.guest_client.get(url)
+        self.assertIsNone(response.context)
+        self.assertIn('Cookie', response['Vary'])
+        Follow.objects.create(
+            user=User.objects.create_user(username='Reader'),
+            author=self.user)
+        response = self.guest_client.get(url)
+        self.assertEqual(response.context['follow_count'], 1)
+
+    def test_writes_invalidate_only_pages_showing_them(self):
+        """Комментарий и правка поста сбрасывают только его страницы"""
+        other = User.objects.create_user(username='Other')
+        group = Group.objects.create(title='Группа', slug='group')
+        other_group = Group.objects.create(title='Другая', slug='other')
+        post = Post.objects.create(text='Пост в группе', author=other,
+                                   group=group)
+        urls = {
+            'index': reverse('index'),
+            'group': reverse('group', kwargs={'slug': 'group'}),
+            'other_group': reverse('group', kwargs={'slug': 'other'}),
+            'profile': reverse('profile', kwargs={'username': 'Other'}),
+            'other_profile': reverse(
+                'profile', kwargs={'username': self.user.username}),
+            'post': reverse('post', kwargs={'username': 'Other',
+                                            'post_id': post.id}),
+            'other_post': reverse('post', kwargs={
+                'username': self.user.username, 'post_id': self.post.id}),
+        }
+
+        def rendered():
+            return {name for name, url in urls.items()
+                    if self.guest_client.get(url).context is not None}
+
+        self.assertEqual(rendered(), set(urls))
+        self.assertEqual(rendered(), set())
+        Comment.objects.create(post=post, author=self.user,
+                               text='Комментарий')
+        self.assertEqual(rendered(), {'index', 'group', 'profile', 'post'})
+        post.group = other_group
+        post.save()
+        self.assertEqual(rendered(), {'index', 'group', 'other_group',
+                                      'profile', 'post'})
+
+    def test_bump_changes_only_its_scope(self):
+        posts_version, feed_version = get_versions('posts', 'feed:1')
+        bump('feed:1')
+        self.assertEqual(get_versions('posts')[0], posts_version)
+        self.assertNotEqual(get_versions('feed:1')[0], feed_version)
+
+    def test_versions_expire_without_shared_cache(self):
+        """Версия в кеше процесса живет не дольше фрагментов"""
+        later = time.time() + settings.FEED_CACHE_TIMEOUT + 1
+        for timeout, expired in ((settings.FEED_CACHE_TIMEOUT, True),
+                                 (None, False)):
+            with self.subTest(timeout=timeout), \
+                    override_settings(CACHE_VERSION_TIMEOUT=timeout):
+                cache.clear()
+                version = get_versions('posts')[0]
+                with mock.patch('time.time', return_value=later):
+                    self.assertEqual(get_versions('posts')[0] != version,
+                                     expired)
+
+
+@override_settings(SHARED_CACHE=True)
+class ConditionalGetTest(TransactionTestCase):
+    """Неизменившиеся страницы отдаются как 304 без работы с базой"""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(username='TestUser')
+        self.post = Post.objects.create(text='Первый пост', author=self.user)
+        self.urls = (
+            reverse('index'),
+            reverse('profile', kwargs={'username': self.user.username}),
+            reverse('post', kwargs={'username': self.user.username,
+                                    'post_id': self.post.id}),
+        )
+
+    def test_unchanged_page_is_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_validators_change_with_content(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий')
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_validators_follow_own_scopes(self):
+        """Комментарий к чужому посту не меняет валидаторы страниц"""
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        other = Post.objects.create(
+            text='Чужой пост',
+            author=User.objects.create_user(username='Other'))
+        Comment.objects.create(post=other, author=self.user,
+                               text='Комментарий')
+        # Главная показывает все посты и меняется вместе с ними
+        for url, etag, status in zip(self.urls, etags, (200, 304, 304)):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_no_validators_without_shared_cache(self):
+        response = self.client.get(self.urls[0])
+        self.assertFalse(response.has_header('ETag'))
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        """Страница гостя не подходит вошедшему пользователю"""
+        etag = self.client.get(self.urls[0])['ETag']
+        self.client.force_login(self.user)
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertIn('private', response['Cache-Control'])
+
+
+class PostDetailCacheTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username='Author')
+        self.post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Первый комментарий')
+        self.url = reverse('post', kwargs={'username': 'Author',
+                                           'post_id': self.post.id})
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(
+            User.objects.create_user(username='Reader'))
+
+    def comment_queries(self, client):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(self.url)
+        return response, [query for query in queries
+                          if 'FROM "posts_comment"' in query['sql']]
+
+    def test_cached_detail_skips_comment_query(self):
+        """Повторный просмотр берет карточку и комментарии из кеша"""
+        self.author_client.get(self.url)
+        response, queries = self.comment_queries(self.reader_client)
+        self.assertFalse(queries)
+        self.assertContains(response, 'Первый комментарий')
+
+    def test_viewer_pieces_are_not_cached(self):
+        """Кнопка правки и форма комментария - только для своих"""
+        edit_url = reverse('post_edit', kwargs={'username': 'Author',
+                                                'post_id': self.post.id})
+        self.assertContains(self.author_client.get(self.url), edit_url)
+        response = self.reader_client.get(self.url)
+        self.assertNotContains(response, edit_url)
+        self.assertContains(response, 'Добавить комментарий:')
+        self.assertNotContains(Client().get(self.url),
+                               'Добавить комментарий:')
+
+    def test_post_and_comment_changes_invalidate(self):
+        self.reader_client.get(self.url)
+        comment = Comment.objects.create(post=self.post, author=self.author,
+                                         text='Второй комментарий')
+        response, queries = self.comment_queries(self.reader_client)
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, 'Второй комментарий')
+        self.assertContains(response, 'Комментариев: 2')
+        comment.delete()
+        self.assertNotContains(self.reader_client.get(self.url),
+                               'Второй комментарий')
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        self.assertContains(self.reader_client.get(self.url),
+                            'Исправленный пост')
+
+    def test_comment_edit_invalidates(self):
+        """Правка комментария видна сразу, а не после истечения кеша"""
+        self.reader_client.get(self.url)
+        comment = self.post.comments.get()
+        comment.text = 'Исправленный комментарий'
+        comment.save()
+        response = self.reader_client.get(self.url)
+        self.assertContains(response, 'Исправленный комментарий')
+        self.assertNotContains(response, 'Первый комментарий')
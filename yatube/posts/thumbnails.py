@@ -0,0 +1,119 @@
+"""
+Фоновая подготовка миниатюр постов.
+
+Все геометрии из settings.POST_THUMBNAILS нарезаются в пуле потоков
+сразу после сохранения картинки, а шаблоны берут только готовые
+миниатюры и до тех пор показывают заглушку. Картинку могли сохранить
+и в обход views (админка, shell, старые посты), а задача могла упасть,
+поэтому промах в шаблоне тоже ставит нарезку в пул.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Как get_thumbnail, но без нарезки: None, если миниатюры нет."""
+        source = ImageFile(file_)
+        # Опции дополняются так же, как в ThumbnailBackend.get_thumbnail,
+        # иначе имя файла миниатюры не совпадет.
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = ReadyThumbnailBackend()
+
+
+def ready_thumbnail(image, name):
+    if not image:
+        return None
+    geometry, options = settings.POST_THUMBNAILS[name]
+    return backend.get_ready_thumbnail(image, geometry, **options)
+
+
+def generate_thumbnails(image_name):
+    for geometry, options in settings.POST_THUMBNAILS.values():
+        get_thumbnail(image_name, geometry, **options)
+    # В закешированных страницах пока стоят заглушки.
+    posts = Post.objects.filter(image=image_name).select_related(
+        'author', 'group')
+    posts.update(updated=timezone.now())
+    caching.bump(*{scope for post in posts
+                   for scope in caching.post_scopes(post)})
+
+
+def _run(func, *args):
+    # Битая картинка не должна ронять ни поток пула, ни запрос, в котором
+    # обработка идет без пула
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая обработка картинки %r упала', args)
+
+
+def _run_in_worker(func, *args):
+    try:
+        _run(func, *args)
+    finally:
+        # Соединения с БД у каждого потока свои.
+        connections.close_all()
+
+
+def submit(func, *args):
+    """Запускает обработку картинки в пуле (или сразу, если пула нет)."""
+    global _executor
+    if not settings.THUMBNAIL_WORKERS:
+        _run(func, *args)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    _executor.submit(_run_in_worker, func, *args)
+
+
+def queue_thumbnails(post):
+    """Ставит нарезку миниатюр поста в очередь после коммита."""
+    if post.image:
+        image_name = post.image.name
+        transaction.on_commit(
+            lambda: submit(generate_thumbnails, image_name))
+
+
+def queue_missing_thumbnails(image_name):
+    """
+    Ставит нарезку в пул, если шаблон не нашел готовой миниатюры. Пока
+    задача не старше THUMBNAIL_RETRY_SECONDS, повторные промахи - в том
+    числе в других процессах при общем кеше - ее не дублируют.
+    """
+    key = 'thumbnails:queued:' + hashlib.md5(
+        image_name.encode()).hexdigest()
+    if cache.add(key, True, settings.THUMBNAIL_RETRY_SECONDS):
+        submit(generate_thumbnails, image_name)
@@ -1,61 +1,97 @@
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest,
+                         StreamingHttpResponse)
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
-from .models import Post, Group, User, Follow
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.functional import SimpleLazyObject
+from . import events
+from .models import Post, Group, User, Follow, AuthorStats, FeedEntry
+from .caching import (SITE, cache_anonymous_page, cache_version,
+                      conditional_page)
+from .export import EXPORTS, FORMATS, filename, stream
 from .forms import PostForm, CommentForm
+from .images import queue_variants
+from .paginator import KeysetPaginator
+from .search import search_posts
+from .thumbnails import queue_thumbnails
+
+
+COMMENTS_PER_PAGE = 20
 
 
 def _get_posts(request, filter_: dict):
     post_list = Post.objects.filter(**filter_).select_related(
         'author',
         'group'
-    ).all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return page
+    )
+    paginator = KeysetPaginator(post_list, 10)
+    return paginator.get_cursor_page(request.GET)
+
+
+def _get_comments(request, post):
+    comments = post.comments.select_related('author')
+    paginator = KeysetPaginator(comments, COMMENTS_PER_PAGE,
+                                keys=('created', 'id'))
+    return paginator.get_cursor_page(request.GET)
+
+
+def _author_counts(author):
+    stats = AuthorStats.objects.for_user(author)
+    return stats.post_count, stats.follower_count, stats.following_count
 
 
-def _read_author(username):
-    author = get_object_or_404(User, username=username)
-    post_count = Post.objects.filter(author=author).count()
-    follow_count = Follow.objects.filter(
-        author=author
-    ).count()
-    self_follow_count = Follow.objects.filter(
-        user=author
-    ).count()
-    return author, post_count, follow_count, self_follow_count
+def _read_author(username, viewer=None):
+    authors = User.objects.select_related('stats')
+    if viewer is not None and viewer.is_authenticated:
+        # Подписка зрителя читается тем же запросом, что и автор
+        authors = authors.annotate(is_followed=Exists(
+            Follow.objects.filter(user=viewer, author=OuterRef('pk'))))
+    author = get_object_or_404(authors, username=username)
+    return (author, *_author_counts(author))
 
 
 def _read_post(request, post_id):
+    # Автор со счетчиками приходит вместе с постом, без второго запроса
     post = Post.objects.filter(id=post_id).select_related(
-        'author',
+        'author__stats',
         'group'
-    ).prefetch_related('comments').last()
-    author, count_post, follow_count, self_follow_count = _read_author(post.author.username)
+    ).last()
+    author = post.author
+    count_post, follow_count, self_follow_count = _author_counts(author)
     form = CommentForm(request.POST or None)
-    all_comments = post.comments.select_related('author').all().order_by('-created')
     return {
         'author': author,
         'post': post,
         'count_post': count_post,
         'form': form,
-        'comments': all_comments,
+        # Комментарии читаются, только если их раздела нет в кеше
+        'comments': SimpleLazyObject(lambda: _get_comments(request, post)),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT,
         'profile': author,
         'follow_count': follow_count,
         'self_follow_count': self_follow_count,
     }
 
 
+@conditional_page('posts')
+@cache_anonymous_page('posts')
 def index(request):
     page = _get_posts(request, {})
     return render(request,
                   'index.html',
                   {'page': page,
-                   'page_number': page.number})
+                   'page_number': page.number,
+                   'cache_timeout': settings.FEED_CACHE_TIMEOUT,
+                   'cache_version': cache_version(SITE, 'posts')})
 
 
+@conditional_page('group:{slug}')
+@cache_anonymous_page('group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     page = _get_posts(request, {'group': group})
@@ -67,14 +103,13 @@ def group_posts(request, slug):
                   })
 
 
+@conditional_page('author:{username}')
+@cache_anonymous_page('author:{username}')
 def profile(request, username):
-    author, count_post, follow_count, self_follow_count = _read_author(username)
+    author, count_post, follow_count, self_follow_count = _read_author(
+        username, request.user)
     page = _get_posts(request, {'author': author})
-    check_follow = False
-    if request.user.is_authenticated:
-        check_follow = Follow.objects.filter(
-            user=request.user, author=author
-        ).exists()
+    check_follow = getattr(author, 'is_followed', False)
     return render(request,
                   'profile.html',
                   {'page': page,
@@ -86,6 +121,8 @@ def profile(request, username):
                    'self_follow_count': self_follow_count, })
 
 
+@conditional_page('post:{post_id}', 'author:{username}')
+@cache_anonymous_page('post:{post_id}', 'author:{username}')
 def post_view(request, username, post_id):
     context = _read_post(request, post_id)
     return render(request,
@@ -93,7 +130,20 @@ def post_view(request, username, post_id):
                   context)
 
 
+@conditional_page('post:{post_id}')
+@cache_anonymous_page('post:{post_id}')
+def post_comments(request, username, post_id):
+    """Следующая страница комментариев для кнопки "Показать еще"."""
+    post = get_object_or_404(Post.objects.select_related('author'),
+                             id=post_id, author__username=username)
+    return render(request,
+                  'includes/comment_page.html',
+                  {'post': post,
+                   'comments': _get_comments(request, post)})
+
+
 @login_required
+@transaction.atomic
 def add_comment(request, username, post_id):
     context = _read_post(request, post_id)
     if context['form'].is_valid():
@@ -108,6 +158,7 @@ def add_comment(request, username, post_id):
 
 
 @login_required
+@transaction.atomic
 def new_post(request):
     if request.method == 'POST':
         form = PostForm(request.POST, files=request.FILES or None)
@@ -115,6 +166,9 @@ def new_post(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            queue_thumbnails(post)
+            queue_variants(post)
+            transaction.on_commit(lambda: events.publish_post(post))
             return redirect('index')
     form = PostForm()
     return render(request,
@@ -130,8 +184,16 @@ def post_edit(request, username, post_id):
         return redirect('post', username, post_id)
     form = PostForm(request.POST or None, files=request.FILES or None,
                     instance=this_post)
+    # Варианты прежней картинки удаляются после того, как она заменена
+    stale_variants = this_post.variants
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        if 'image' in form.changed_data:
+            post.image_variants = ''
+        post.save()
+        if 'image' in form.changed_data:
+            queue_thumbnails(post)
+            queue_variants(post, stale_variants)
         return redirect('post', username, post_id)
     return render(request,
                   'create_and_edit_post.html',
@@ -140,6 +202,18 @@ def post_edit(request, username, post_id):
                    'is_edit': True, })
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = [], None
+    if query:
+        posts, next_cursor = search_posts(query, request.GET.get('after'))
+    return render(request,
+                  'search.html',
+                  {'query': query,
+                   'posts': posts,
+                   'next_cursor': next_cursor, })
+
+
 def page_not_found(request, exception):
     return render(
         request,
@@ -154,12 +228,23 @@ def server_error(request):
 
 @login_required
 def follow_index(request):
-    page = _get_posts(request, {'author__following__user': request.user})
-    return render(request, 'follow.html', {'page': page,
-                                           'page_number': page.number,})
+    feed = FeedEntry.objects.filter(user=request.user).select_related(
+        'post__author',
+        'post__group'
+    )
+    paginator = KeysetPaginator(feed, 10, transform=attrgetter('post'))
+    page = paginator.get_cursor_page(request.GET)
+    version = cache_version(SITE, 'posts', f'feed:{request.user.id}')
+    return render(request, 'follow.html', {
+        'page': page,
+        'page_number': page.number,
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'cache_version': version,
+    })
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     if request.user.username == username:
         return redirect('profile', username)
@@ -177,8 +262,75 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     user = get_object_or_404(User, username=username)
     unfollow = get_object_or_404(Follow, user=request.user, author=user)
     unfollow.delete()
     return redirect('profile', user.username)
+
+
+def export_data(request, name):
+    """Выгрузка таблицы для сотрудников, отдается по мере чтения."""
+    if not request.user.is_staff:
+        raise PermissionDenied
+    if name not in EXPORTS:
+        raise Http404
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest('Неизвестный формат')
+    compress = request.GET.get('gzip') == '1'
+    content_type = ('application/gzip' if compress
+                    else FORMATS[fmt] + '; charset=utf-8')
+    response = StreamingHttpResponse(stream(name, fmt, compress),
+                                     content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{filename(name, fmt, compress)}"')
+    return response
+
+
+def _event_stream(request, channels, posts):
+    last_id = (request.META.get('HTTP_LAST_EVENT_ID')
+               or request.GET.get('last_event_id'))
+    last_id = int(last_id) if last_id and last_id.isdigit() else None
+    try:
+        source = events.Stream(channels, posts, last_id)
+    except events.Busy:
+        # EventSource не переподключается после 503: кнопка на странице
+        # предложит попробовать позже
+        response = HttpResponse('Слишком много открытых потоков',
+                                status=503)
+        response['Retry-After'] = settings.EVENTS_STREAM_SECONDS
+        return response
+    response = StreamingHttpResponse(
+        source, content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен копить поток в буфере
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def group_events(request, slug):
+    """События о новых постах группы."""
+    group = get_object_or_404(Group, slug=slug)
+    return _event_stream(request, {f'group:{group.id}'},
+                         Post.objects.filter(group=group))
+
+
+@login_required
+def follow_events(request):
+    """События о новых постах авторов, на которых подписан пользователь."""
+    authors = Follow.objects.filter(
+        user=request.user).values_list('author_id', flat=True)
+    return _event_stream(request,
+                         {f'author:{author}' for author in authors},
+                         Post.objects.filter(
+                             author__following__user=request.user))
+
+
+def post_card(request, username, post_id):
+    """Карточка одного поста для вставки в ленту по событию."""
+    post = get_object_or_404(Post.objects.select_related('author', 'group'),
+                             id=post_id, author__username=username)
+    return render(request, 'includes/post_item.html', {'post': post})
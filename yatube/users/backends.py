@@ -0,0 +1,59 @@
+"""
+Загрузка пользователя для AuthenticationMiddleware через общий кеш.
+
+ModelBackend читает пользователя из базы на каждом запросе. Здесь он
+берется из кеша на AUTH_USER_CACHE_TIMEOUT секунд. Ключ версионируется
+областью user:<id>, которую сохранение и удаление пользователя сдвигают
+после коммита (users.signals). Хеш пароля приходит вместе с объектом,
+так что смена пароля по-прежнему завершает остальные сессии.
+
+В AUTHENTICATION_BACKENDS только этот бэкенд: с ModelBackend рядом
+неудачный вход проверял бы пароль дважды. Сессии, открытые до перехода,
+хранят путь ModelBackend, и SessionBackendMiddleware переписывает его.
+"""
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from posts.caching import cache_version
+
+USER_KEY = 'user:{}:{}'
+CACHED_BACKEND = 'users.backends.CachedModelBackend'
+# Бэкенды, которыми открыты сессии до перехода на кеш
+LEGACY_BACKENDS = {'django.contrib.auth.backends.ModelBackend'}
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        timeout = settings.AUTH_USER_CACHE_TIMEOUT
+        if not timeout:
+            return super().get_user(user_id)
+        key = USER_KEY.format(cache_version(user_scope(user_id)), user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, timeout)
+        return user
+
+
+class SessionBackendMiddleware:
+    """
+    Переводит старые сессии на CachedModelBackend: иначе
+    AuthenticationMiddleware не найдет их бэкенд в настройках и
+    разлогинит пользователя. Ставится между SessionMiddleware и
+    AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.session.get(BACKEND_SESSION_KEY) in LEGACY_BACKENDS:
+            request.session[BACKEND_SESSION_KEY] = CACHED_BACKEND
+        return self.get_response(request)
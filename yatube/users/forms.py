@@ -1,10 +1,36 @@
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.urls import resolve, reverse
 
 User = get_user_model()
 
+# Адреса страниц пользователя: если какой-то из них с этим именем
+# перехватывает другой маршрут (search/, export/<name>/, new/ ...),
+# страницы пользователя были бы недоступны
+USER_ROUTES = (
+    ('profile', {}),
+    ('post', {'post_id': 1}),
+    ('profile_follow', {}),
+    ('profile_unfollow', {}),
+)
+
+
+def shadowed(username):
+    for name, kwargs in USER_ROUTES:
+        url = reverse(name, kwargs={'username': username, **kwargs})
+        if resolve(url).url_name != name:
+            return True
+    return False
+
 
 class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ('first_name', 'last_name', 'username', 'email')
+
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        if shadowed(username):
+            raise ValidationError('Это имя занято адресом страницы сайта.')
+        return username
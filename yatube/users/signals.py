@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from posts import caching
+
+from .backends import user_scope
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # id запоминается сразу: после удаления у объекта его уже нет. Версия
+    # сдвигается после коммита, иначе запрос успел бы закешировать старого
+    # пользователя уже под новой версией.
+    scope = user_scope(instance.pk)
+    transaction.on_commit(lambda: caching.bump(scope))
@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.contrib.auth import BACKEND_SESSION_KEY, authenticate, base_user
+from django.core.cache import cache
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Follow, Post, User
+from ..backends import CACHED_BACKEND
+
+CACHED_SESSIONS = {
+    'cache': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+
+class SessionQueriesTest(TransactionTestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(username='Reader',
+                                             password='Пароль-123')
+        self.author = User.objects.create_user(username='Author')
+        self.post = Post.objects.create(text='Пост', author=self.author)
+        self.requests = {
+            'follow_index': lambda client: client.get(
+                reverse('follow_index')),
+            'add_comment': lambda client: client.post(
+                reverse('add_comment', args=['Author', self.post.id]),
+                {'text': 'Комментарий'}),
+            'new_post': lambda client: client.post(
+                reverse('new_post'), {'text': 'Новый пост'}),
+            'profile_follow': lambda client: client.get(
+                reverse('profile_follow', args=['Author'])),
+        }
+
+    def count_queries(self):
+        client = Client()
+        client.force_login(self.user)
+        # Первый запрос кладет пользователя в кеш
+        client.get(reverse('follow_index'))
+        counts = {}
+        for name, request in self.requests.items():
+            Follow.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                response = request(client)
+            self.assertIn(response.status_code, (200, 302))
+            counts[name] = len(queries)
+        return counts
+
+    def test_cached_modes_skip_session_and_user_queries(self):
+        """Сессия и пользователь не читаются из базы на каждом запросе"""
+        baseline = self.count_queries()
+        for mode, engine in CACHED_SESSIONS.items():
+            with self.subTest(mode=mode), override_settings(
+                    SESSION_ENGINE=engine, AUTH_USER_CACHE_TIMEOUT=60):
+                self.assertEqual(
+                    self.count_queries(),
+                    {name: count - 2 for name, count in baseline.items()})
+
+    @override_settings(
+        SESSION_ENGINE=CACHED_SESSIONS['cache'], AUTH_USER_CACHE_TIMEOUT=60)
+    def test_user_changes_invalidate_cache(self):
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('follow_index')
+        self.assertEqual(client.get(url).status_code, 200)
+        self.user.set_password('Другой-пароль-456')
+        self.user.save()
+        # Хеш пароля в сессии больше не совпадает - сессия закрыта
+        self.assertEqual(client.get(url).status_code, 302)
+        client.force_login(self.user)
+        self.assertEqual(client.get(url).status_code, 200)
+        User.objects.get(id=self.user.id).delete()
+        self.assertEqual(client.get(url).status_code, 302)
+
+
+class BackendTest(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='Reader',
+                                             password='Пароль-123')
+
+    def test_failed_login_checks_password_once(self):
+        """Неверный пароль проверяется одним бэкендом, а не каждым"""
+        with mock.patch.object(base_user, 'check_password',
+                               wraps=base_user.check_password) as check:
+            self.assertIsNone(authenticate(username='Reader',
+                                           password='Неверный'))
+        self.assertEqual(check.call_count, 1)
+
+    def test_legacy_session_keeps_user_logged_in(self):
+        """Сессия, открытая через ModelBackend, переводится на кеш"""
+        client = Client()
+        client.force_login(
+            self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = client.get(reverse('follow_index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'], self.user)
+        self.assertEqual(client.session[BACKEND_SESSION_KEY],
+                         CACHED_BACKEND)
@@ -0,0 +1,18 @@
+from django.test import TestCase
+from ..forms import CreationForm
+
+
+class CreationFormTest(TestCase):
+    def form(self, username):
+        return CreationForm({'username': username,
+                             'password1': 'Пароль-123-длинный',
+                             'password2': 'Пароль-123-длинный'})
+
+    def test_route_names_are_rejected(self):
+        """Имя не должно прятать страницы пользователя за маршрутами"""
+        for username in ('search', 'export', 'new', 'follow', 'group'):
+            with self.subTest(username=username):
+                form = self.form(username)
+                self.assertFalse(form.is_valid())
+                self.assertIn('username', form.errors)
+        self.assertTrue(self.form('reader').is_valid())
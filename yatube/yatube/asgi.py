@@ -0,0 +1,148 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Django 2.2 has no ASGI handler of its own, so the WSGI application is run
+in a bounded thread pool: the event loop only accepts connections and
+moves bytes, and a slow thumbnail or media read holds one pool thread
+instead of a whole worker process. Pool size is ``ASGI_THREADS``.
+
+asgiref's WsgiToAsgi is not used: since asgiref 3.3 it runs every request
+through thread-sensitive sync_to_async, i.e. on a single shared thread,
+and it does not watch for client disconnects. Here a disconnect stops the
+response iterator, so a closed tab does not keep a pool thread busy.
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+
+def build_environ(scope, body):
+    """WSGI environ для HTTP-запроса ASGI с уже прочитанным телом."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI передает путь байтами, раскодированными как latin-1
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        if name in environ:
+            value = environ[name] + ',' + value
+        environ[name] = value
+    return environ
+
+
+class WsgiToAsgi:
+    """ASGI 3 приложение поверх WSGI, запросы идут в пуле потоков."""
+
+    def __init__(self, wsgi_application, threads):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        environ = build_environ(scope, b''.join(body))
+        loop = asyncio.get_running_loop()
+        disconnected = threading.Event()
+        watcher = loop.create_task(
+            self.watch_disconnect(receive, disconnected))
+        try:
+            await loop.run_in_executor(
+                self.executor, self.run_wsgi, environ, loop, send,
+                disconnected)
+        finally:
+            watcher.cancel()
+
+    async def watch_disconnect(self, receive, disconnected):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    def run_wsgi(self, environ, loop, send, disconnected):
+        """
+        Выполняется в потоке пула; ответ отправляется по кускам, пока
+        клиент не отключился.
+        """
+        def send_sync(message):
+            # Поток ждет отправки - медленный клиент не раздувает память
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers]
+
+        chunks = self.wsgi_application(environ, start_response)
+        try:
+            send_sync({'type': 'http.response.start', **response})
+            for chunk in chunks:
+                if disconnected.is_set():
+                    return
+                if chunk:
+                    send_sync({'type': 'http.response.body', 'body': chunk,
+                               'more_body': True})
+            send_sync({'type': 'http.response.body', 'body': b''})
+        finally:
+            # close() шлет request_finished: закрываются старые соединения
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+
+application = WsgiToAsgi(get_wsgi_application(), settings.ASGI_THREADS)
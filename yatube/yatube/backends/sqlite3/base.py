@@ -0,0 +1,37 @@
+"""
+SQLite с настройками для работы под нагрузкой.
+
+При каждом подключении выполняются PRAGMA из PRAGMAS, поверх которых
+ложатся ``OPTIONS['pragmas']`` из settings:
+
+- journal_mode=WAL - читатели не ждут писателя и наоборот;
+- synchronous=NORMAL - в режиме WAL fsync только на контрольных точках,
+  закоммиченное не теряется при падении процесса, только при сбое ОС;
+- mmap_size и cache_size - чтение страниц из памяти, а не через read();
+- busy_timeout - писатели ждут друг друга, а не падают с
+  "database is locked".
+"""
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # отрицательное значение - в килобайтах, то есть 64 МБ
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
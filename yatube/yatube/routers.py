@@ -0,0 +1,70 @@
+"""
+Чтение с реплик, запись - в основную базу.
+
+Реплики читаются только внутри безопасных запросов (GET, HEAD, OPTIONS),
+которые отметил PrimaryPinMiddleware; команды, фоновые потоки и
+пишущие запросы целиком работают с основной базой. После первой записи
+запрос до конца читает из основной базы - реплика еще не видит ни
+записи, ни незакоммиченной транзакции, - а пользователь получает cookie,
+которая REPLICA_PIN_SECONDS держит на основной базе и его следующие
+запросы: так он сразу видит свой пост, комментарий или подписку.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'primary_db'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Сессии читаются в каждом запросе, и отставшая реплика, не видящая
+# свежей сессии, разлогинила бы пользователя
+PRIMARY_APPS = ('sessions', )
+
+_state = threading.local()
+
+
+def use_primary():
+    """Переводит чтение до конца текущего запроса на основную базу."""
+    _state.replicas = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (settings.DATABASE_REPLICAS and getattr(_state, 'replicas', False)
+                and model._meta.app_label not in PRIMARY_APPS):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _state.replicas = False
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Все базы - копии одних и тех же данных
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryPinMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.replicas = (request.method in SAFE_METHODS
+                           and PIN_COOKIE not in request.COOKIES)
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.replicas = False
+            _state.wrote = False
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
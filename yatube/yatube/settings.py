@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'about',
+    'api',
     'sorl.thumbnail',
     # 'debug_toolbar',
 ]
@@ -54,8 +55,11 @@ INTERNAL_IPS = [
 
 
 MIDDLEWARE = [
+    'posts.metrics.MetricsMiddleware',
+    'yatube.routers.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'users.backends.SessionBackendMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -64,17 +68,111 @@ MIDDLEWARE = [
     #'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Кеш, общий для всех воркеров: YATUBE_CACHE=memcached://127.0.0.1:11211,
+# memcached://unix:/run/memcached.sock или file:///var/tmp/yatube_cache.
+# Для memcached:// нужен python-memcached из requirements.txt.
+# Без переменной кеш живет в памяти процесса.
+YATUBE_CACHE = os.environ.get('YATUBE_CACHE', '')
+if YATUBE_CACHE.startswith('memcached://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'posts.metrics.MemcachedCache',
+            'LOCATION': YATUBE_CACHE[len('memcached://'):],
+        }
     }
-}
+elif YATUBE_CACHE.startswith('file://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'posts.metrics.FileBasedCache',
+            'LOCATION': YATUBE_CACHE[len('file://'):],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'posts.metrics.LocMemCache',
+        }
+    }
+# Сброс версии в общем кеше сразу виден всем воркерам. Кеш процесса о
+# чужих записях не узнает, поэтому без YATUBE_CACHE все, что держится
+# на версиях, хранится недолго.
+SHARED_CACHE = bool(YATUBE_CACHE)
+# Сессии: db - в базе; cache - cached_db, чтение из кеша и запись сквозь
+# него в базу; signed_cookies - в подписанной cookie, без хранилища (выход
+# тогда не отзывает украденную cookie). Сессии и пользователь кешируются
+# по умолчанию только с общим YATUBE_CACHE: в кеше процесса выход или
+# смена пароля в одном воркере не были бы видны остальным.
+SESSION_MODE = os.environ.get('YATUBE_SESSIONS',
+                              'cache' if YATUBE_CACHE else 'db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
+# Сессии, открытые до перехода на кеш через ModelBackend, переводит
+# users.backends.SessionBackendMiddleware
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+# Сколько секунд держать пользователя в кеше; 0 - читать из базы
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get(
+    'YATUBE_USER_CACHE', 15 * 60 if YATUBE_CACHE else 0))
+# Ключи лент версионируются и сбрасываются при записи, поэтому в общем
+# кеше фрагменты можно хранить долго. В кеше процесса чужой воркер
+# отдает старый фрагмент до истечения TTL
+FEED_CACHE_TIMEOUT = 60 * 60 if SHARED_CACHE else 20
+# Версии областей в общем кеше не истекают, в кеше процесса живут
+# не дольше фрагментов
+CACHE_VERSION_TIMEOUT = None if SHARED_CACHE else FEED_CACHE_TIMEOUT
+# Сколько держать в кеше приблизительное число записей для ссылки
+# на последнюю страницу
+PAGE_COUNT_CACHE_TIMEOUT = 10 * 60
+# Поток событий о новых постах закрывается через столько секунд, и
+# EventSource переподключается; пока событий нет, шлется пустой комментарий.
+# Брокер событий живет в памяти процесса: посты из других процессов
+# приходят только при переподключении (см. posts.events)
+EVENTS_STREAM_SECONDS = 60
+EVENTS_HEARTBEAT_SECONDS = 15
+# Готовые страницы для анонимных посетителей, ключи тоже версионируются;
+# без общего кеша живут столько же, сколько фрагменты
+PAGE_CACHE_TIMEOUT = 60 * 60 if SHARED_CACHE else FEED_CACHE_TIMEOUT
+# Метка выкладки входит в ETag страниц: новая версия шаблонов не должна
+# отвечать 304 на страницы, закешированные браузером до выкладки
+RELEASE_ID = os.environ.get('YATUBE_RELEASE', '')
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Сколько последних постов хранится в ленте подписок пользователя
+FEED_MAX_LENGTH = 1000
+
+# Миниатюры постов: имя -> (геометрия, опции sorl). Все они нарезаются
+# в фоне после загрузки картинки, шаблоны показывают только готовые,
+# а на промахе ставят нарезку в очередь
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Потоков для нарезки миниатюр; 0 - нарезать прямо после коммита запроса
+THUMBNAIL_WORKERS = 2
+# Через сколько секунд промах в шаблоне снова ставит нарезку, если
+# прежняя задача так и не справилась
+THUMBNAIL_RETRY_SECONDS = 5 * 60
+# Адаптивные варианты картинок постов для <picture>/srcset: ширины,
+# пропорции карточки и форматы (неизвестные Pillow пропускаются)
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_FORMATS = ('AVIF', 'WEBP', 'JPEG')
+POST_IMAGE_QUALITY = 80
+
+# Метрики /metrics: каталог, куда процессы сбрасывают свои значения
+# (общий для всех воркеров), и как часто сбрасывать, в секундах
+METRICS_DIR = os.environ.get('YATUBE_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1
+
+# Эталонные замеры bench_views и допустимый рост времени/объема (доля)
+BENCH_BASELINE = os.path.join(BASE_DIR, 'bench_baseline.json')
+BENCH_THRESHOLD = 0.25
+
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "index"
 
@@ -85,7 +183,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'posts.metrics.DjangoTemplates',
         'DIRS': [
             TEMPLATES_DIR,
         ],
@@ -103,18 +201,46 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# Потоков пула, в котором yatube.asgi выполняет запросы
+ASGI_THREADS = int(os.environ.get('YATUBE_ASGI_THREADS', 32))
+# Поток событий держит поток пула: открыто не больше стольких на процесс,
+# остальным отвечает 503, чтобы обычным запросам хватало потоков
+EVENTS_MAX_STREAMS = int(os.environ.get('YATUBE_EVENTS_MAX_STREAMS',
+                                        ASGI_THREADS // 2))
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite в режиме WAL с PRAGMA для нагрузки (см. yatube.backends.sqlite3);
+# соединение живет между запросами YATUBE_CONN_MAX_AGE секунд
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 600)),
     }
 }
 
+# Реплики только для чтения через запятую:
+# YATUBE_REPLICAS=/var/lib/yatube/replica1.sqlite3,/var/lib/yatube/replica2.sqlite3
+# Локально это копии основной базы (см. manage.py sync_replicas), в тестах
+# реплики смотрят в тестовую основную базу.
+DATABASE_REPLICAS = []
+for number, name in enumerate(
+        filter(None, os.environ.get('YATUBE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'yatube.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['yatube.routers.ReplicaRouter']
+# Сколько секунд после записи пользователь читает только из основной
+# базы, пока реплики догоняют
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
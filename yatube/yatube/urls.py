@@ -18,6 +18,7 @@ from django.urls import include, path
 from django.conf.urls import handler404, handler500
 from django.conf import settings
 from django.conf.urls.static import static
+from posts.metrics import metrics_view
 # import debug_toolbar
 
 handler404 = "posts.views.page_not_found"  # noqa
@@ -27,6 +28,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/v1/', include('api.urls', namespace='api')),
     path('', include('posts.urls')),
     path('about/', include('about.urls', namespace='about')),
 #    path('__debug__/', include(debug_toolbar.urls)),